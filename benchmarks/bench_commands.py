@@ -0,0 +1,116 @@
+"""
+Command benchmark for the binge CLI, run against the local API stub.
+
+For every library size a fresh database is filled with `binge import`, then the
+script times `add` on a few extra shows, a full `refresh --force` that bypasses
+the HTTP cache, and the `list` and `catalog` commands. Every command runs as its
+own process, like it would from a shell, with the IMDb and YouTube endpoints
+pointed at benchmarks/stub_server.py.
+
+    python benchmarks/bench_commands.py [--sizes 10,100,1000,10000] [--jobs N]
+        [--episodes N] [--latency-ms MS] [--error-rate R] [--adds N] [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_server import StubConfig, StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+
+def run(args: list[str], cwd: str, env: dict) -> float:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "BingeWatcher.main", *args],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"binge {' '.join(args)} failed:\n{result.stdout}{result.stderr}")
+    return elapsed
+
+
+def write_library(path: str, size: int):
+    with open(path, "w") as f:
+        for i in range(size):
+            f.write(json.dumps({
+                "type": "show",
+                "title_id": f"tt{i:07d}",
+                "name": f"Show{i:05d}",
+                "status": "watching",
+                "last_watched": i % 20,
+                "rating": i % 10 + 1,
+                "notify": True,
+            }) + "\n")
+
+
+def bench_size(size: int, args, server: StubServer) -> dict:
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(
+            os.environ,
+            PYTHONPATH=SRC,
+            XDG_CACHE_HOME=os.path.join(cwd, "cache"),
+            BINGEWATCHER_DB=os.path.join(cwd, "bingewatcher.db"),
+            BINGEWATCHER_IMDB_API=server.url,
+            BINGEWATCHER_YOUTUBE_API=server.url,
+            YOUTUBE_API_KEY="bench",
+            YOUTUBE_DAILY_QUOTA=str(10 ** 9),
+        )
+
+        library = os.path.join(cwd, "library.jsonl")
+        write_library(library, size)
+
+        before = server.state.requests
+        results = {"import": run(["import", library, "--jobs", str(args.jobs)], cwd, env)}
+        results["import_requests"] = server.state.requests - before
+
+        adds = []
+        for i in range(args.adds):
+            title_id = f"tt9{i:06d}"
+            adds.append(run(["add", f"Extra{i}", f"https://www.imdb.com/title/{title_id}/"], cwd, env))
+        results["add"] = adds
+
+        before = server.state.requests
+        results["refresh"] = run(["--no-cache", "refresh", "--force", "--jobs", str(args.jobs)], cwd, env)
+        results["refresh_requests"] = server.state.requests - before
+
+        results["list"] = [run(["list"], cwd, env) for _ in range(args.runs)]
+        results["catalog"] = [run(["catalog"], cwd, env) for _ in range(args.runs)]
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma separated library sizes.")
+    parser.add_argument("--jobs", type=int, default=8, help="Parallel jobs for import and refresh.")
+    parser.add_argument("--episodes", type=int, default=StubConfig.episodes, help="Episodes per stub show.")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Delay the stub adds to every response.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of stub responses that are 429s.")
+    parser.add_argument("--adds", type=int, default=3, help="Number of shows added one by one.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of list and catalog per size.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    config = StubConfig(episodes=args.episodes, latency_ms=args.latency_ms, error_rate=args.error_rate)
+
+    print(f"{'shows':>7} {'import s':>9} {'requests':>9} {'add ms':>8} {'refresh s':>10} {'shows/s':>8} {'requests':>9} "
+          f"{'list ms':>8} {'catalog ms':>11}")
+    with StubServer(config) as server:
+        for size in sizes:
+            r = bench_size(size, args, server)
+            print(
+                f"{size:>7} {r['import']:>9.2f} {r['import_requests']:>9} {statistics.median(r['add']) * 1000:>8.0f} "
+                f"{r['refresh']:>10.2f} {size / r['refresh']:>8.0f} {r['refresh_requests']:>9} "
+                f"{statistics.median(r['list']) * 1000:>8.0f} {statistics.median(r['catalog']) * 1000:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Startup time benchmark for the binge CLI.
+
+Times how long it takes to import BingeWatcher.main and to run commands that
+should never touch the database or the YouTube client, and lists the slowest
+imports reported by `python -X importtime`.
+
+    python benchmarks/bench_startup.py [--runs N] [--max-ms MS]
+
+With --max-ms the script exits non-zero when the median import time goes over
+the limit, so it can guard against startup regressions in CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+HEAVY_MODULES = ("googleapiclient", "httplib2", "google.auth")
+
+
+def bench_env(cwd: str) -> dict:
+    """Environment that keeps the database, cache and config inside cwd."""
+    return dict(
+        os.environ,
+        PYTHONPATH=SRC,
+        BINGEWATCHER_DB=db_path(cwd),
+        XDG_DATA_HOME=os.path.join(cwd, "data"),
+        XDG_CACHE_HOME=os.path.join(cwd, "cache"),
+        XDG_CONFIG_HOME=os.path.join(cwd, "config"),
+    )
+
+
+def db_path(cwd: str) -> str:
+    return os.path.join(cwd, "bingewatcher.db")
+
+
+def run(args: list[str], cwd: str) -> float:
+    env = bench_env(cwd)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=cwd, env=env, check=True, capture_output=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def import_profile(cwd: str) -> list[tuple[int, str]]:
+    env = bench_env(cwd)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import BingeWatcher.main"],
+        cwd=cwd, env=env, check=True, capture_output=True, text=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Number of runs per measurement.")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median import time exceeds this.")
+    args = parser.parse_args()
+
+    cases = {
+        "import BingeWatcher.main": ["-c", "import BingeWatcher.main"],
+        "binge --version": ["-m", "BingeWatcher.main", "--version"],
+        "binge --help": ["-m", "BingeWatcher.main", "--help"],
+    }
+
+    with tempfile.TemporaryDirectory() as cwd:
+        results = {}
+        for label, case in cases.items():
+            timings = [run(case, cwd) for _ in range(args.runs)]
+            results[label] = statistics.median(timings)
+            print(f"{label:<28} median {results[label]:8.1f} ms   min {min(timings):8.1f} ms")
+
+        created = os.path.exists(db_path(cwd))
+        print(f"\ndatabase created during startup: {'yes' if created else 'no'}")
+
+        modules = import_profile(cwd)
+
+    heavy = sorted({name.split(".")[0] for _, name in modules if name.startswith(HEAVY_MODULES)})
+    print(f"heavy optional modules imported: {', '.join(heavy) if heavy else 'none'}")
+
+    print("\nslowest imports (cumulative):")
+    for cumulative, name in sorted(modules, reverse=True)[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    median_import = results["import BingeWatcher.main"]
+    if args.max_ms is not None and median_import > args.max_ms:
+        print(f"\nFAIL: import took {median_import:.1f} ms, limit is {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
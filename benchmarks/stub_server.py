@@ -0,0 +1,243 @@
+"""
+Local stand-in for the IMDb and YouTube APIs used by the benchmarks.
+
+Serves synthetic data for every title id it is asked about:
+
+    GET  /titles/{id}                       title metadata (always a tvSeries)
+    GET  /titles:batchGet?titleIds=...      metadata for up to 5 titles at once
+    GET  /titles/{id}/episodes              paged episode lists with nextPageToken chains
+    GET  /youtube/v3/search                 fake search results
+    POST /batch                             YouTube HTTP batch requests of searches
+
+A share of GET requests can be answered with 429 and a Retry-After header to
+exercise the client's rate limiting and retries.
+
+Point BingeWatcher at it with
+
+    BINGEWATCHER_IMDB_API=http://127.0.0.1:PORT
+    BINGEWATCHER_YOUTUBE_API=http://127.0.0.1:PORT
+
+It can also be run on its own:
+
+    python benchmarks/stub_server.py --port 8765 --episodes 120 --latency-ms 20
+"""
+import argparse
+import email.parser
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class StubConfig:
+    # Episodes per show, of which the last `future` are not released yet.
+    episodes: int = 60
+    future: int = 2
+    # Delay added to every response, to mimic a remote API.
+    latency_ms: float = 0
+    # Share of GET requests answered with 429 Too Many Requests, and the Retry-After sent with them.
+    error_rate: float = 0
+    retry_after: float = 0
+    # Answer /titles:batchGet, or 404 it like an API without the batch endpoint.
+    title_batches: bool = True
+
+
+class StubState:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+    def episodes(self, title_id: str) -> list[dict]:
+        config = self.config
+        today = date.today()
+        first = today - timedelta(days=7 * (config.episodes - config.future))
+
+        episodes = []
+        for i in range(config.episodes):
+            release = first + timedelta(days=7 * i)
+            episodes.append({
+                "id": f"{title_id}e{i}",
+                "title": f"Episode {i + 1}",
+                "season": str(i // 10 + 1),
+                "episodeNumber": i % 10 + 1,
+                "plot": f"Plot of episode {i + 1} of {title_id}.",
+                "rating": {"aggregateRating": 7 + (i % 30) / 10, "voteCount": 100},
+                "releaseDate": {"year": release.year, "month": release.month, "day": release.day},
+            })
+        return episodes
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def delay(self):
+            state.count()
+            if state.config.latency_ms:
+                time.sleep(state.config.latency_ms / 1000)
+
+        def do_GET(self):
+            self.delay()
+            if random.random() < state.config.error_rate:
+                self.send_response(429)
+                self.send_header("Retry-After", f"{state.config.retry_after:g}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            parts = urlsplit(self.path)
+            status, body = route_get(parts.path, parse_qs(parts.query))
+            self.send_json(body, status)
+
+        def do_POST(self):
+            self.delay()
+            length = int(self.headers.get("Content-Length", 0))
+            payload = self.rfile.read(length)
+
+            if urlsplit(self.path).path != "/batch":
+                self.send_json({"error": "not found"}, 404)
+                return
+
+            boundary = "batch_stub_boundary"
+            body = answer_batch(self.headers.get("Content-Type", ""), payload, boundary).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def route_get(path: str, query: dict) -> tuple[int, dict]:
+        segments = path.strip("/").split("/")
+
+        if segments[:3] == ["youtube", "v3", "search"]:
+            return 200, search_results(query.get("q", [""])[0], int(query.get("maxResults", ["5"])[0]))
+
+        if segments == ["titles:batchGet"] and state.config.title_batches:
+            title_ids = query.get("titleIds", [])
+            if len(title_ids) > 5:
+                return 400, {"error": "at most 5 titleIds"}
+            return 200, {"titles": [title(title_id) for title_id in title_ids]}
+
+        if len(segments) == 2 and segments[0] == "titles":
+            return 200, title(segments[1])
+
+        if len(segments) == 3 and segments[0] == "titles" and segments[2] == "episodes":
+            episodes = state.episodes(segments[1])
+            size = int(query.get("pageSize", ["50"])[0])
+            start = int(query.get("pageToken", ["0"])[0])
+
+            body = {"episodes": episodes[start:start + size], "totalCount": len(episodes)}
+            if start + size < len(episodes):
+                body["nextPageToken"] = str(start + size)
+            return 200, body
+
+        return 404, {"error": "not found"}
+
+    def answer_batch(content_type: str, payload: bytes, boundary: str) -> str:
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + payload
+        )
+
+        parts = []
+        for part in message.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().lstrip().split("\r\n", 1)[0].split("\n", 1)[0]
+            target = urlsplit(request_line.split(" ")[1])
+            status, body = route_get(target.path, parse_qs(target.query))
+
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(body)}\r\n"
+            )
+        return "".join(parts) + f"--{boundary}--\r\n"
+
+    return Handler
+
+
+def title(title_id: str) -> dict:
+    return {"id": title_id, "type": "tvSeries", "primaryTitle": f"Show {title_id}", "startYear": 2010}
+
+
+def search_results(query: str, max_results: int) -> dict:
+    # Titles are shaped so that BingeWatcher's matching finds a trailer for single word show names.
+    words = query.split()
+    title = " ".join(words).lower()
+    return {"items": [
+        {"id": {"videoId": f"vid{abs(hash(query)) % 10 ** 8}{i}"}, "snippet": {"title": title}}
+        for i in range(min(max_results, 2))
+    ]}
+
+
+class StubServer:
+    """Runs the stub on a background thread; use as a context manager."""
+
+    def __init__(self, config: StubConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = StubState(config or StubConfig())
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--episodes", type=int, default=StubConfig.episodes, help="Episodes per show.")
+    parser.add_argument("--future", type=int, default=StubConfig.future, help="Unreleased episodes per show.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 429.")
+    parser.add_argument("--retry-after", type=float, default=0, help="Retry-After seconds sent with each 429.")
+    parser.add_argument("--no-title-batches", action="store_true", help="404 /titles:batchGet requests.")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        episodes=args.episodes, future=args.future, latency_ms=args.latency_ms,
+        error_rate=args.error_rate, retry_after=args.retry_after, title_batches=not args.no_title_batches,
+    )
+    with StubServer(config, port=args.port) as server:
+        print(f"Serving stub APIs at {server.url}, press Ctrl+C to stop.")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
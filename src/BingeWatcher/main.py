@@ -1,17 +1,36 @@
 import os
 import sqlite3
+import csv
 import json
+import re
+import difflib
+import configparser
+import pathlib
+import sys
+import time
+import gzip
+import hashlib
+import heapq
+import random
+import zlib
+import threading
+import queue
+import http.client
+from abc import ABC, abstractmethod
 from enum import Enum
-from datetime import date
-from urllib.parse import urlparse
-from urllib.request import urlopen, Request
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from urllib.parse import urlparse, urlsplit, urlencode, unquote, urljoin
 from urllib.error import URLError, HTTPError
-from contextlib import contextmanager
+from contextlib import contextmanager, ExitStack
+from functools import wraps
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
 
 import typer
 from typer import Argument, Option
-from typing_extensions import Annotated, Optional
-from googleapiclient.discovery import build
+from typing_extensions import Annotated, Any, Optional, Callable, Iterable, Iterator
 
 __version__ = "0.0.4"
 
@@ -29,16 +48,310 @@ class Status(str, Enum):
     dropped = "dropped"
     watched = "watched"
 
-conn = sqlite3.connect("bingewatcher.db")
-conn.execute("PRAGMA foreign_keys = ON")
-cursor = conn.cursor()
+# API base URLs. They can be pointed at a mirror or at the stub server in benchmarks/.
+IMDB_API = os.getenv("BINGEWATCHER_IMDB_API", "https://api.imdbapi.dev").rstrip("/")
+YOUTUBE_API = os.getenv("BINGEWATCHER_YOUTUBE_API", "https://youtube.googleapis.com").rstrip("/") + "/"
+YOUTUBE_URL = f"{YOUTUBE_API}youtube/v3"
+
+# Maximum number of requests in flight at once for each API host. The limiter starts
+# there, halves it when the host pushes back and creeps back up while requests succeed.
+HOST_LIMITS = {
+    urlsplit(YOUTUBE_API).hostname: 2,
+    urlsplit(IMDB_API).hostname: 4,
+}
+DEFAULT_HOST_LIMIT = 2
+# Most requests per second sent to each API host, with bursts of up to one second's worth.
+# Like the concurrency, the rate is halved on 429/503 and regains RATE_STEP of the
+# maximum per success.
+HOST_RATES = {
+    urlsplit(YOUTUBE_API).hostname: 10.0,
+    urlsplit(IMDB_API).hostname: 100.0,
+}
+DEFAULT_HOST_RATE = 10.0
+RATE_STEP = 0.02
+MIN_HOST_RATE = 0.5
+
+# Retries for 429s, 5xx answers and dropped connections, with full jitter exponential
+# backoff starting at RETRY_BASE_DELAY seconds and capped at RETRY_MAX_DELAY.
+API_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+# Failures in a row after which requests to a host fail fast, and seconds until one
+# request is let through to probe whether it recovered.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+# Maximum number of searches sent in one YouTube batch request.
+YOUTUBE_BATCH_SIZE = 50
+# Quota units charged per search().list call, and the default daily allowance.
+YOUTUBE_SEARCH_COST = 100
+YOUTUBE_DAILY_QUOTA = 10000
+# Seconds a search result for an episode is trusted before searching again.
+VIDEO_FOUND_TTL = 30 * 24 * 60 * 60
+VIDEO_MISSING_TTL = 2 * 24 * 60 * 60
+
+# Polling bounds for `binge watch`, in seconds. The minimum matches the episode page cache TTL.
+WATCH_MIN_INTERVAL = 60 * 60
+WATCH_MAX_INTERVAL = 7 * 24 * 60 * 60
+WATCH_DEFAULT_INTERVAL = 24 * 60 * 60
+# How often watch looks for shows that were added or had notifications turned on.
+WATCH_RESCAN_INTERVAL = 5 * 60
+# Recent episodes used to estimate a show's release cadence.
+CADENCE_EPISODES = 8
+# A show with no upcoming episode and nothing released for this long is treated as finished.
+FINISHED_AFTER = 180 * 24 * 60 * 60
+# Seconds before refresh checks a show again even though nothing is due: schedules move,
+# new seasons get announced and finished shows occasionally come back.
+REFRESH_MAX_AGE = 3 * 24 * 60 * 60
+REFRESH_ENDED_AGE = 30 * 24 * 60 * 60
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:145.0) Gecko/20100101 Firefox/145.0"
+HTTP_TIMEOUT = 15
+# Redirects followed per request, and the statuses that count as one.
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# The database is $BINGEWATCHER_DB, else db_path from the [bingewatcher] section of
+# CONFIG_FILE, else bingewatcher.db in the XDG data directory.
+CONFIG_FILE = os.path.join(
+    os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+    "bingewatcher",
+    "config.ini",
+)
+DATA_DIR = os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+    "bingewatcher",
+)
+# Seconds a connection waits for another process to release its write lock.
+DB_BUSY_TIMEOUT = 30
+
+CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "bingewatcher",
+    "http",
+)
+# Seconds a cached API response is served without asking the API again.
+# The first entry whose fragment appears in the URL path wins.
+CACHE_TTLS = (
+    ("/episodes", 60 * 60),
+    ("/titles/", 7 * 24 * 60 * 60),
+)
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Order statuses are grouped in by list and catalog.
+STATUS_ORDER = ["watched", "dropped", "on_hold", "plan_to_watch", "watching"]
+STATUS_ORDER_SQL = "CASE s.status {} END".format(
+    " ".join(f"WHEN '{status}' THEN {i}" for i, status in enumerate(STATUS_ORDER))
+)
+
+# Pending episodes joined with their show, in the column order format_episode expects.
+LIST_QUERY = """SELECT s.name, e.number, e.title, s.status, e.rating,
+    s.latest_episode, s.has_trailer, s.has_related_video, s.video_link, s.id
+    FROM new_episodes e JOIN shows s ON s.id = e.show_id"""
+LIST_FIELDS = ("show", "number", "title", "status", "rating",
+    "latest_episode", "has_trailer", "has_related_video", "video_link", "show_id")
+
+# Shows in the column order format_show expects.
+CATALOG_QUERY = """SELECT s.name, s.status, s.latest_episode, s.last_watched, s.rating, s.notify
+    FROM shows s"""
+CATALOG_FIELDS = ("name", "status", "latest_episode", "last_watched", "rating", "notify")
+
+# Shows with their show_stats summary, in the column order print_stats expects.
+STATS_QUERY = """SELECT s.name, s.status, st.pending, st.max_pending, st.rating_sum, st.last_refreshed
+    FROM show_stats st JOIN shows s ON s.id = st.show_id"""
+
+# Notified shows worth asking the API about: never synced, reached their next release
+# date, or not checked for a while. Parameters: today, now - REFRESH_MAX_AGE, now - REFRESH_ENDED_AGE.
+DUE_SQL = """(last_refreshed IS NULL
+    OR next_release_date <= ?
+    OR (ended = 0 AND last_refreshed < ?)
+    OR (ended = 1 AND last_refreshed < ?))"""
+
+# Page token a show's sync resumes from; NULL until its episode catalog exists. A show
+# added again after a delete picks up where its title's catalog left off.
+RESUME_TOKEN = """CASE WHEN EXISTS (SELECT 1 FROM episodes WHERE episodes.title_id = shows.title_id)
+    THEN COALESCE(last_page_token, (SELECT t.last_page_token FROM titles t WHERE t.title_id = shows.title_id)) END"""
+
+# Most values bound to one IN (...) list, under the 999 variable limit of older SQLite builds.
+SQL_VARIABLES_LIMIT = 500
+
+# Title types that can be added as shows.
+SHOW_TYPES = ("tvSeries", "tvMiniSeries")
+
+# Titles per /titles:batchGet request, the most the API accepts in one call.
+TITLE_BATCH_SIZE = 5
+
+# Results shown by binge search, and for fuzzy matching how many trigram candidates are
+# scored per result and the word similarity (0 to 1) a candidate needs to be shown.
+SEARCH_LIMIT = 20
+FUZZY_CANDIDATES = 10
+FUZZY_MIN_SCORE = 0.6
+
+_host_limiters: dict[str, "HostLimiter"] = {}
+_host_limiters_lock = threading.Lock()
+
+_youtube_client = None
+_youtube_lock = threading.Lock()
+
+# Cleared when the IMDb API turns out not to have /titles:batchGet.
+_title_batches = True
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    json = "json"
+    jsonl = "jsonl"
+
+class OutputFormat(str, Enum):
+    table = "table"
+    json = "json"
+    ndjson = "ndjson"
+
+class CommitMode(str, Enum):
+    show = "show"
+    refresh = "refresh"
+
+# Rows rendered before the output is written out in one go.
+OUTPUT_BATCH = 1000
+
+# Negative values are KiB, so this gives SQLite a 16 MiB page cache.
+DB_CACHE_SIZE = -16 * 1024
+
+# Opened on first use so commands like --version and --help never touch the database.
+conn: Optional[sqlite3.Connection] = None
+cursor: Optional[sqlite3.Cursor] = None
+
+_transaction_depth = 0
+
+
+def db_path() -> str:
+    path = os.getenv("BINGEWATCHER_DB")
+    if not path:
+        config = configparser.ConfigParser()
+        try:
+            config.read(CONFIG_FILE)
+        except configparser.Error as e:
+            raise typer.Exit(f"Invalid config file {CONFIG_FILE}: {e}")
+        path = config.get("bingewatcher", "db_path", fallback=None)
+
+    return os.path.expanduser(path) if path else os.path.join(DATA_DIR, "bingewatcher.db")
+
+
+def open_db(read_only: bool = False):
+    """
+    Connect to the database. Query commands ask for a read-only connection, which never
+    takes a write lock; it falls back to a normal one while the file doesn't exist yet or
+    still needs migrating.
+    """
+    global conn, cursor
+
+    path = db_path()
+    try:
+        with metrics.timer("db.open"):
+            if read_only and os.path.exists(path):
+                uri = f"{pathlib.Path(path).resolve().as_uri()}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT)
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA user_version")
+                if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                    cursor.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+                    return
+                conn.close()
+
+            default_path = os.path.join(DATA_DIR, "bingewatcher.db")
+            if path == default_path and not os.path.exists(path) and os.path.exists("bingewatcher.db"):
+                typer.echo(
+                    f"Found bingewatcher.db in the current directory, but the database now lives at {path}. "
+                    "Move the file there or set BINGEWATCHER_DB to keep using it.",
+                    err=True,
+                )
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT)
+            cursor = conn.cursor()
+
+            # WAL lets readers run alongside a refresh, and with it synchronous=NORMAL is still
+            # crash safe while skipping an fsync per commit. journal_mode is stored in the file.
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+            cursor.execute("PRAGMA foreign_keys = ON")
+
+            migrate()
+    except (sqlite3.Error, OSError) as e:
+        raise typer.Exit(f"Database System Error: {e}")
+
+
+@contextmanager
+def refresh_lock(wait: bool):
+    """
+    Hold an exclusive lock on a file next to the database while syncing shows, so
+    overlapping refreshes (a cron job and an interactive run, say) take turns instead of
+    fetching and writing the same shows twice. The OS releases it if the process dies.
+    """
+    path = f"{db_path()}.refresh.lock"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lock = open(path, "a")
+    except OSError as e:
+        raise typer.Exit(f"Could not create the refresh lock {path}: {e}")
+
+    with lock:
+        if not lock_file(lock, wait):
+            raise typer.Exit("Another refresh is already running, try again when it finishes.")
+        yield
+
+
+def lock_file(f, wait: bool) -> bool:
+    """Lock an open file exclusively until it is closed; False if wait is off and it is taken."""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
 
 
 @contextmanager
-def db_transaction():
+def db_transaction(read_only: bool = False):
+    """
+    Commit the enclosed statements as one unit. Nested blocks join the outermost
+    transaction, so only the outermost block commits or rolls back. read_only only
+    matters for the block that opens the database.
+    """
+    global _transaction_depth
+
+    if conn is None:
+        open_db(read_only)
+
+    if _transaction_depth:
+        _transaction_depth += 1
+        try:
+            yield cursor
+        finally:
+            _transaction_depth -= 1
+        return
+
+    _transaction_depth = 1
+    start = time.perf_counter()
     try:
         yield cursor
-        conn.commit()
+        with metrics.timer("db.commit"):
+            conn.commit()
+    except typer.Exit:
+        conn.rollback()
+        raise
     except sqlite3.IntegrityError as e:
         conn.rollback()
         if "UNIQUE constraint failed" in str(e):
@@ -51,6 +364,9 @@ def db_transaction():
     except Exception as e:
         conn.rollback()
         raise typer.Exit(f"Unexpected Error: {e}")
+    finally:
+        _transaction_depth = 0
+        metrics.observe("db.transaction", time.perf_counter() - start)
 
 
 def version_callback(value: bool):
@@ -61,6 +377,11 @@ def version_callback(value: bool):
 
 @app.callback()
 def main(
+    ctx: typer.Context,
+    no_cache: Annotated[
+        bool,
+        typer.Option("--no-cache", help="Ignore and don't store cached API responses.")
+    ] = False,
     version: Annotated[
         Optional[bool],
         typer.Option(
@@ -71,14 +392,42 @@ def main(
             help="Show the version and exit."
         )
     ] = None,
+    timings: Annotated[
+        bool,
+        typer.Option("--timings", help="Print where the command spent its time when it finishes.")
+    ] = False,
+    metrics_file: Annotated[
+        Optional[str],
+        typer.Option("--metrics-file", help="Append the command's timings and counters to this file as a JSON line.")
+    ] = None,
 ):
     """
     BingeWatcher CLI tool
     """
+    if no_cache:
+        response_cache.enabled = False
+    else:
+        ctx.call_on_close(response_cache.evict)
+
+    if timings or metrics_file:
+        metrics.enabled = True
+        started = time.perf_counter()
+
+        def report():
+            command = ctx.invoked_subcommand
+            metrics.observe(f"command.{command}", time.perf_counter() - started)
+            snapshot = metrics.snapshot(command)
+            if timings:
+                metrics.print_summary(snapshot)
+            if metrics_file:
+                metrics.write(metrics_file, snapshot)
+
+        ctx.call_on_close(report)
 
 
-def init_db():
-    schema = """CREATE TABLE IF NOT EXISTS shows(
+def migrate_v1():
+    """Base schema. Databases from before versioning already have some of it."""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS shows(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     title_id TEXT NOT NULL UNIQUE,
     name TEXT NOT NULL UNIQUE,
@@ -94,8 +443,8 @@ def init_db():
     has_related_video INTEGER DEFAULT 0 NOT NULL,
     video_link TEXT,
     video_title TEXT
-    );
-                CREATE TABLE IF NOT EXISTS new_episodes(
+    )""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS new_episodes(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     show_id INTEGER NOT NULL,
     number INTEGER NOT NULL,
@@ -103,13 +452,774 @@ def init_db():
     plot TEXT,
     rating REAL DEFAULT 0 NOT NULL,
     FOREIGN KEY (show_id) REFERENCES shows(id) ON DELETE CASCADE
-    );
+    )""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS episodes(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title_id TEXT NOT NULL,
+    episode_id TEXT NOT NULL,
+    season TEXT,
+    episode_number INTEGER,
+    number INTEGER,
+    title TEXT NOT NULL,
+    plot TEXT,
+    rating REAL DEFAULT 0 NOT NULL,
+    release_date TEXT,
+    UNIQUE (title_id, episode_id)
+    )""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS episodes_number ON episodes(title_id, number)")
+    add_missing_columns("shows", {"next_release_date": "TEXT"})
+
+
+def migrate_v2():
+    """YouTube lookup cache and quota bookkeeping."""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS video_lookups(
+    show_id INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    video_flag TEXT,
+    video_link TEXT,
+    video_title TEXT,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (show_id, number),
+    FOREIGN KEY (show_id) REFERENCES shows(id) ON DELETE CASCADE
+    )""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS youtube_quota(
+    day TEXT PRIMARY KEY,
+    units INTEGER DEFAULT 0 NOT NULL
+    )""")
+    add_missing_columns("shows", {"video_episode": "INTEGER"})
+
+
+def migrate_v3():
+    """Indexes for the per-show episode lookups and the notify/status filters."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS new_episodes_show_number ON new_episodes(show_id, number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS shows_notify_status ON shows(notify, status)")
+
+
+def migrate_v4():
+    """When a show was added, for catalog --date. Older shows keep NULL and sort first."""
+    add_missing_columns("shows", {"added_at": "TEXT"})
+
+
+def migrate_v5():
+    """Bookkeeping that lets refresh skip shows with nothing due."""
+    add_missing_columns("shows", {"ended": "INTEGER DEFAULT 0 NOT NULL", "last_refreshed": "REAL"})
+
+
+def migrate_v6():
+    """Make (show_id, number) unique in new_episodes, dropping duplicates left by overlapping refreshes."""
+    cursor.execute("""DELETE FROM new_episodes WHERE id NOT IN (
+        SELECT MIN(id) FROM new_episodes GROUP BY show_id, number
+    )""")
+    cursor.execute("DROP INDEX IF EXISTS new_episodes_show_number")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS new_episodes_show_number ON new_episodes(show_id, number)")
+
+
+def migrate_v7():
+    """
+    Full-text index for binge search, kept in sync by triggers. Shows are stored at rowid
+    id * 2 and pending episodes at id * 2 + 1. search_trigrams backs fuzzy matching and is
+    left out, like the whole index, when the SQLite build lacks it.
+    """
+    cursor.execute("DROP TABLE IF EXISTS search_index")
+    cursor.execute("DROP TABLE IF EXISTS search_trigrams")
+    try:
+        cursor.execute("""CREATE VIRTUAL TABLE search_index USING fts5(
+        name, title, plot, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )""")
+    except sqlite3.OperationalError:
+        return
+    # Weights for bm25 over (name, title, plot), so ORDER BY rank favours names and titles.
+    cursor.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')")
+
+    tables = {"search_index": 3}
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE search_trigrams USING fts5(name, title, tokenize = 'trigram')")
+        tables["search_trigrams"] = 2
+    except sqlite3.OperationalError:
+        pass
+
+    for table, width in tables.items():
+        # search_trigrams only has the first two columns.
+        columns = ", ".join(["name", "title", "plot"][:width])
+        show_values = ", ".join(["{show}.name"] + ["''"] * (width - 1))
+        episode_values = ", ".join(["{show}.name", "{episode}.title", "COALESCE({episode}.plot, '')"][:width])
+        episode_update = ", ".join(["title = new.title", "plot = COALESCE(new.plot, '')"][:width - 1])
+
+        cursor.execute(f"""CREATE TRIGGER {table}_show_insert AFTER INSERT ON shows BEGIN
+            INSERT INTO {table} (rowid, {columns}) VALUES (new.id * 2, {show_values.format(show="new")});
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {table}_show_delete AFTER DELETE ON shows BEGIN
+            DELETE FROM {table} WHERE rowid = old.id * 2;
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {table}_show_rename AFTER UPDATE OF name ON shows BEGIN
+            UPDATE {table} SET name = new.name
+            WHERE rowid = new.id * 2 OR rowid IN (SELECT id * 2 + 1 FROM new_episodes WHERE show_id = new.id);
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {table}_episode_insert AFTER INSERT ON new_episodes BEGIN
+            INSERT INTO {table} (rowid, {columns})
+            SELECT new.id * 2 + 1, {episode_values.format(show="s", episode="new")} FROM shows s WHERE s.id = new.show_id;
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {table}_episode_delete AFTER DELETE ON new_episodes BEGIN
+            DELETE FROM {table} WHERE rowid = old.id * 2 + 1;
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {table}_episode_update AFTER UPDATE OF title, plot ON new_episodes BEGIN
+            UPDATE {table} SET {episode_update} WHERE rowid = new.id * 2 + 1;
+        END""")
+
+        cursor.execute(f"INSERT INTO {table} (rowid, {columns}) SELECT id * 2, {show_values.format(show='s')} FROM shows s")
+        cursor.execute(f"""INSERT INTO {table} (rowid, {columns})
+        SELECT e.id * 2 + 1, {episode_values.format(show="s", episode="e")} FROM new_episodes e JOIN shows s ON s.id = e.show_id""")
+
+
+def migrate_v8():
+    """
+    Per-show summary of pending episodes for binge stats, kept up to date by triggers.
+    The rating is stored as a sum so each insert or delete only adjusts one row; the
+    highest pending number comes from the (show_id, number) index after a delete.
+    """
+    cursor.execute("DROP TABLE IF EXISTS show_stats")
+    cursor.execute("""CREATE TABLE show_stats(
+    show_id INTEGER PRIMARY KEY,
+    pending INTEGER DEFAULT 0 NOT NULL,
+    max_pending INTEGER,
+    rating_sum REAL DEFAULT 0 NOT NULL,
+    last_refreshed REAL,
+    FOREIGN KEY (show_id) REFERENCES shows(id) ON DELETE CASCADE
+    )""")
+
+    cursor.execute("""CREATE TRIGGER show_stats_show_insert AFTER INSERT ON shows BEGIN
+        INSERT INTO show_stats (show_id, last_refreshed) VALUES (new.id, new.last_refreshed);
+    END""")
+    cursor.execute("""CREATE TRIGGER show_stats_show_refresh AFTER UPDATE OF last_refreshed ON shows BEGIN
+        UPDATE show_stats SET last_refreshed = new.last_refreshed WHERE show_id = new.id;
+    END""")
+    cursor.execute("""CREATE TRIGGER show_stats_episode_insert AFTER INSERT ON new_episodes BEGIN
+        UPDATE show_stats SET
+            pending = pending + 1,
+            max_pending = MAX(COALESCE(max_pending, new.number), new.number),
+            rating_sum = rating_sum + new.rating
+        WHERE show_id = new.show_id;
+    END""")
+    cursor.execute("""CREATE TRIGGER show_stats_episode_delete AFTER DELETE ON new_episodes BEGIN
+        UPDATE show_stats SET
+            pending = pending - 1,
+            max_pending = (SELECT MAX(number) FROM new_episodes WHERE show_id = old.show_id),
+            rating_sum = rating_sum - old.rating
+        WHERE show_id = old.show_id;
+    END""")
+    cursor.execute("""CREATE TRIGGER show_stats_episode_rating AFTER UPDATE OF rating ON new_episodes BEGIN
+        UPDATE show_stats SET rating_sum = rating_sum + new.rating - old.rating WHERE show_id = new.show_id;
+    END""")
+
+    cursor.execute("""INSERT INTO show_stats (show_id, pending, max_pending, rating_sum, last_refreshed)
+    SELECT s.id, COUNT(e.id), MAX(e.number), COALESCE(SUM(e.rating), 0), s.last_refreshed
+    FROM shows s LEFT JOIN new_episodes e ON e.show_id = s.id
+    GROUP BY s.id""")
+
+
+def migrate_v9():
+    """
+    Local title metadata, so add and import only ask the API about titles they haven't
+    seen. Also remembers how far each title's episode catalog was synced, which outlives
+    the show rows that point at it.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS titles(
+    title_id TEXT PRIMARY KEY,
+    type TEXT,
+    primary_title TEXT,
+    start_year INTEGER,
+    end_year INTEGER,
+    rating REAL,
+    last_page_token TEXT,
+    fetched_at REAL
+    )""")
+    cursor.execute("""INSERT OR IGNORE INTO titles (title_id, last_page_token)
+    SELECT title_id, last_page_token FROM shows""")
+
+
+# Applied in order; a database at PRAGMA user_version N still needs MIGRATIONS[N:].
+# Never edit a released migration, append a new one instead.
+MIGRATIONS = [
+    migrate_v1,
+    migrate_v2,
+    migrate_v3,
+    migrate_v4,
+    migrate_v5,
+    migrate_v6,
+    migrate_v7,
+    migrate_v8,
+    migrate_v9,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate():
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+
+    for target, migration in enumerate(MIGRATIONS[version:], version + 1):
+        # DDL doesn't open a transaction implicitly, so start one to apply each step atomically.
+        cursor.execute("BEGIN")
+        try:
+            migration()
+            cursor.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+
+def add_missing_columns(table: str, columns: dict[str, str]):
+    """Add columns that databases created by older versions are missing."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+class CircuitOpenError(URLError):
+    """Raised instead of sending a request to a host that keeps failing."""
+
+
+class HostLimiter:
+    """
+    Admission control for one API host. A token bucket caps the request rate, and both
+    the rate and the number of requests in flight follow AIMD: they grow a little with
+    every success and halve on 429/503, with Retry-After pausing the host. After
+    BREAKER_THRESHOLD failures in a row the circuit opens and requests fail fast until
+    a probe gets through.
+    """
+
+    def __init__(self, host: str, max_concurrency: int, max_rate: float):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.tokens = max(max_rate, 1.0)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Wait for a slot and a token, returning when the request was let through."""
+        with self._cond:
+            if self.failures >= BREAKER_THRESHOLD:
+                if self.probing or time.monotonic() < self.open_until:
+                    metrics.count("http.circuit_open")
+                    raise CircuitOpenError(f"{self.host} is failing, not sending requests for a while")
+                self.probing = True
+
+            while True:
+                now = time.monotonic()
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.refilled_at) * self.rate)
+                self.refilled_at = now
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return now
+                self._cond.wait(wait)
+
+    def release(self, started: float, error: Optional[BaseException] = None):
+        status = error_status(error)
+        with self._cond:
+            self.in_flight -= 1
+            self.probing = False
+
+            if error is None or not is_transient(error):
+                self.failures = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_STEP)
+            else:
+                self.failures += 1
+                if status in (429, 503):
+                    metrics.count("http.throttled")
+                    # Requests sent before the last cut saw the old limits, so they don't cut again.
+                    if started >= self.decreased_at:
+                        self.concurrency = max(1.0, self.concurrency / 2)
+                        self.rate = max(MIN_HOST_RATE, self.rate / 2)
+                        self.decreased_at = time.monotonic()
+                    delay = retry_after(error)
+                    if delay:
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                if self.failures >= BREAKER_THRESHOLD:
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+            self._cond.notify_all()
+
+
+def error_status(error: Optional[BaseException]) -> Optional[int]:
+    """HTTP status of an urllib or googleapiclient error, None for anything else."""
+    if isinstance(error, HTTPError):
+        return error.code
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None)
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = error_status(error)
+    if status is not None:
+        return status in TRANSIENT_STATUSES
+    return isinstance(error, (URLError, OSError))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds asked for by a Retry-After header, given as seconds or as an HTTP date."""
+    headers = getattr(error, "headers", None) or getattr(error, "resp", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    return max(delay, min(retry_after(error) or 0, RETRY_MAX_DELAY))
+
+
+@contextmanager
+def host_slot(url: str):
+    host = urlparse(url).hostname or ""
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None:
+            limiter = HostLimiter(host, HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT), HOST_RATES.get(host, DEFAULT_HOST_RATE))
+            _host_limiters[host] = limiter
+
+    started = limiter.acquire()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        limiter.release(started, error)
+
+
+class HttpClient:
+    """
+    Small keep-alive HTTP client. Connections are pooled per (scheme, host, port)
+    and handed to one thread at a time, so it is safe to share between workers.
+    Like urlopen it goes through the proxies set in HTTP_PROXY/HTTPS_PROXY, except
+    for hosts listed in NO_PROXY.
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.requests = 0
+        self.opened = 0
+        self.reused = 0
+        self.bytes = 0
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._proxies: dict[tuple[str, str], Optional[tuple[str, int, dict]]] = {}
+        self._lock = threading.Lock()
+
+    def _proxy(self, scheme: str, host: str) -> Optional[tuple[str, int, dict]]:
+        """(host, port, headers) of the proxy to reach host through, or None to connect directly."""
+        with self._lock:
+            if (scheme, host) in self._proxies:
+                return self._proxies[(scheme, host)]
+
+        # Imported here, urllib.request is slow to import and most commands never go online.
+        import urllib.request
+
+        proxy = urllib.request.getproxies().get(scheme)
+        found = None
+        if proxy and not urllib.request.proxy_bypass(host):
+            if "://" not in proxy:
+                proxy = f"http://{proxy}"
+            parts = urlsplit(proxy)
+            headers = {}
+            if parts.username:
+                import base64
+
+                credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+                headers["Proxy-Authorization"] = f"Basic {base64.b64encode(credentials.encode()).decode()}"
+            found = (parts.hostname, parts.port or 80, headers)
+
+        with self._lock:
+            self._proxies[(scheme, host)] = found
+        return found
+
+    def _checkout(self, key: tuple[str, str, int], timeout: float,
+                  proxy: Optional[tuple[str, int, dict]]) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                connection = idle.pop()
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection, True
+            self.opened += 1
+
+        scheme, host, port = key
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=timeout), False
+            return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+        proxy_host, proxy_port, proxy_headers = proxy
+        if scheme == "https":
+            # Tunnelled with CONNECT, so TLS and the certificate check still happen end to end.
+            connection = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=timeout)
+            connection.set_tunnel(host, port, headers=proxy_headers)
+            return connection, False
+        return http.client.HTTPConnection(proxy_host, proxy_port, timeout=timeout), False
+
+    def _checkin(self, key: tuple[str, str, int], connection: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < HOST_LIMITS.get(key[1], DEFAULT_HOST_LIMIT):
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            connections = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "opened": self.opened, "reused": self.reused, "bytes": self.bytes}
+
+    def get(self, url: str, headers: Optional[dict] = None, timeout: Optional[float] = None) -> tuple[int, http.client.HTTPMessage, bytes]:
+        """
+        GET url and return (status, headers, decoded body), following up to MAX_REDIRECTS
+        redirects like urlopen. Raises HTTPError for 4xx/5xx answers and too many
+        redirects, and URLError when the connection itself fails.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response, body = self._get_once(url, headers, timeout)
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                break
+            url = urljoin(url, location)
+        else:
+            raise HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+
+        return response.status, response.headers, body
+
+    def _get_once(self, url: str, headers: Optional[dict], timeout: Optional[float]) -> tuple[http.client.HTTPResponse, bytes]:
+        """One GET on a pooled connection, returning the read response and its decoded body whatever the status."""
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        request_headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        }
+        request_headers.update(headers or {})
+
+        # Plain HTTP proxies take the full URL in the request line.
+        proxy = self._proxy(parts.scheme, parts.hostname)
+        if proxy is not None and parts.scheme == "http":
+            path = url
+            request_headers.update(proxy[2])
+
+        timeout = self.timeout if timeout is None else timeout
+
+        while True:
+            connection, reused = self._checkout(key, timeout, proxy)
+            try:
+                connection.request("GET", path, headers=request_headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionError) as e:
+                connection.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection, retry on a fresh one.
+                    continue
+                raise URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise URLError(e)
+            break
+
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(body)
+            if reused:
+                self.reused += 1
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+
+        return response, decode_body(body, response.getheader("Content-Encoding", ""))
+
+
+def decode_body(body: bytes, encoding: str) -> bytes:
+    encoding = encoding.strip().lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate data without the zlib header.
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+class ResponseCache:
+    """
+    On-disk cache of API responses, one file per URL. Each file holds a JSON
+    metadata line (validators and store time) followed by the raw response body.
     """
-    cursor.executescript(schema)
 
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES, max_age: int = CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = True
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        # Set once a response is written, so commands that only read skip eviction.
+        self.stored = False
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+
+    def ttl(self, url: str) -> int:
+        path = urlsplit(url).path
+        for fragment, ttl in CACHE_TTLS:
+            if fragment in path:
+                return ttl
+        return 0
+
+    def load(self, url: str) -> Optional[tuple[dict, bytes]]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(url), "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return meta, body
+
+    def is_fresh(self, url: str, meta: dict) -> bool:
+        return time.time() - meta["stored_at"] < self.ttl(url)
+
+    def validators(self, meta: dict) -> dict:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        if not self.enabled:
+            return
+        meta = {"url": url, "stored_at": time.time(), "etag": etag, "last_modified": last_modified}
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps(meta).encode() + b"\n")
+                f.write(body)
+            os.replace(tmp_path, path)
+            self.stored = True
+        except OSError:
+            # The cache is an optimisation, a read-only or full disk must not break a command.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        Drop entries older than max_age, then the least recently stored ones until under
+        max_bytes. Does nothing unless this process stored a response.
+        """
+        if not self.stored:
+            return
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        cutoff = time.time() - self.max_age
+        total = 0
+        for mtime, size, path in sorted(entries, reverse=True):
+            if mtime < cutoff or total + size > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            total += size
 
-with db_transaction():
-    init_db()
+    def clear(self):
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class Metrics:
+    """
+    Wall time and counters for one command, collected when --timings or --metrics-file
+    is given. Timers keep (count, total seconds, max seconds) per name; times from
+    worker threads add up, so they can exceed the command's own wall time.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.timers: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += value
+            timer[2] = max(timer[2], value)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self, command: Optional[str] = None) -> dict:
+        lookups = response_cache.hits + response_cache.revalidated + response_cache.misses
+        with self._lock:
+            timers = {
+                name: {"count": count, "total": round(total, 6), "max": round(longest, 6)}
+                for name, (count, total, longest) in sorted(self.timers.items())
+            }
+            counters = dict(sorted(self.counters.items()))
+
+        shows_fetched = counters.get("imdb.episode_syncs")
+        return {
+            "command": command,
+            "time": time.time(),
+            "timers": timers,
+            "counters": counters,
+            "pages_per_show": round(counters.get("imdb.episode_pages", 0) / shows_fetched, 2) if shows_fetched else None,
+            "http": imdb_client.stats(),
+            "cache": {
+                "hits": response_cache.hits,
+                "revalidated": response_cache.revalidated,
+                "misses": response_cache.misses,
+                "hit_rate": round(response_cache.hits / lookups, 4) if lookups else None,
+            },
+        }
+
+    def print_summary(self, snapshot: dict):
+        lines = ["Timings:"]
+        for name, timer in snapshot["timers"].items():
+            average = timer["total"] / timer["count"] * 1000
+            lines.append(
+                f"  {name:<28} {timer['count']:>7}x {timer['total']:>9.3f}s total "
+                f"{average:>9.1f}ms avg {timer['max'] * 1000:>9.1f}ms max"
+            )
+
+        if snapshot["counters"]:
+            lines.append("Counters:")
+            lines.extend(f"  {name:<28} {value:>10}" for name, value in snapshot["counters"].items())
+
+        if snapshot["pages_per_show"] is not None:
+            lines.append(f"Episode pages per show: {snapshot['pages_per_show']}")
+
+        http_stats = snapshot["http"]
+        lines.append(
+            f"HTTP: {http_stats['requests']} requests, {http_stats['bytes']} bytes, "
+            f"{http_stats['opened']} connections opened, {http_stats['reused']} reused"
+        )
+
+        cache = snapshot["cache"]
+        hit_rate = "n/a" if cache["hit_rate"] is None else f"{cache['hit_rate']:.1%}"
+        lines.append(f"Cache: {cache['hits']} hits, {cache['revalidated']} revalidated, {cache['misses']} misses ({hit_rate} hit rate)")
+
+        # stderr, so the summary never ends up in the output of export or list.
+        typer.echo("\n".join(lines), err=True)
+
+    def write(self, path: str, snapshot: dict):
+        """Append the snapshot as one JSON line, so repeated runs build up a history."""
+        try:
+            with open(path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        except OSError as e:
+            typer.echo(f"Could not write metrics to {path}: {e}", err=True)
+
+
+imdb_client = HttpClient()
+response_cache = ResponseCache(CACHE_DIR)
+metrics = Metrics()
 
 
 def get_title_id(link: str) -> str:
@@ -130,160 +1240,501 @@ def get_title_id(link: str) -> str:
     return resource[2]
 
 
-def is_show(title_id: str) -> bool:
-    url = f"https://api.imdbapi.dev/titles/{title_id}"
-
-    req = Request(
-        url,
-        headers={
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:145.0) Gecko/20100101 Firefox/145.0",
-        },
-        method="GET",
+class Title(NamedTuple):
+    """Title metadata, in the column order of the titles table."""
+    title_id: str
+    type: Optional[str]
+    primary_title: Optional[str]
+    start_year: Optional[int]
+    end_year: Optional[int]
+    rating: Optional[float]
+
+
+def parse_title(title_id: str, body: dict) -> Title:
+    return Title(
+        title_id,
+        body.get("type"),
+        body.get("primaryTitle"),
+        body.get("startYear"),
+        body.get("endYear"),
+        body.get("rating", {}).get("aggregateRating"),
     )
 
-    with urlopen(req) as response:
-        body = json.load(response)
 
-    if body["type"] in ["tvSeries", "tvMiniSeries"]:
-        return True
+@metrics.timed("imdb.is_show")
+def fetch_title(title_id: str) -> Title:
+    """Ask the API about a title, without touching the database."""
+    return parse_title(title_id, fetch_page(f"{IMDB_API}/titles/{title_id}"))
+
 
-    return False
+def store_titles(titles: Iterable[Title]):
+    """Upsert fetched title metadata, keeping each title's sync position."""
+    command = """INSERT INTO titles (title_id, type, primary_title, start_year, end_year, rating, fetched_at)
+    VALUES (?,?,?,?,?,?,?)
+    ON CONFLICT (title_id) DO UPDATE SET
+        type = excluded.type,
+        primary_title = excluded.primary_title,
+        start_year = excluded.start_year,
+        end_year = excluded.end_year,
+        rating = excluded.rating,
+        fetched_at = excluded.fetched_at"""
 
+    now = time.time()
+    with db_transaction():
+        cursor.executemany(command, ((*title, now) for title in titles))
 
+
+def local_titles(title_ids: Iterable[str]) -> dict[str, Title]:
+    """Stored metadata for the given titles, leaving out the ones never fetched."""
+    title_ids = list(title_ids)
+    found = {}
+    with db_transaction():
+        for i in range(0, len(title_ids), SQL_VARIABLES_LIMIT):
+            chunk = title_ids[i:i + SQL_VARIABLES_LIMIT]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                f"""SELECT title_id, type, primary_title, start_year, end_year, rating FROM titles
+                WHERE title_id IN ({placeholders}) AND fetched_at IS NOT NULL""",
+                chunk
+            )
+            found.update((row[0], Title(*row)) for row in cursor.fetchall())
+    return found
+
+
+@metrics.timed("imdb.title_batch")
+def fetch_title_batch(title_ids: list[str]) -> dict[str, Title]:
+    """Ask the API about several titles in one request. Titles it doesn't know are left out."""
+    query = urlencode([("titleIds", title_id) for title_id in title_ids])
+    body = fetch_page(f"{IMDB_API}/titles:batchGet?{query}")
+    return {
+        title["id"]: parse_title(title["id"], title)
+        for title in body.get("titles", []) if title.get("id") in title_ids
+    }
+
+
+def fetch_title_chunk(title_ids: list[str]) -> tuple[dict[str, Title], dict[str, str]]:
+    """
+    Look up a chunk of titles with one batch request, or one request per title when the
+    API has no batch endpoint. Returns (titles, why each failed title couldn't be fetched).
+    """
+    global _title_batches
+
+    if _title_batches and len(title_ids) > 1:
+        try:
+            return fetch_title_batch(title_ids), {}
+        except typer.Exit as e:
+            if not (isinstance(e.__cause__, HTTPError) and e.__cause__.code in (400, 404, 405)):
+                return {}, {title_id: str(e.exit_code) for title_id in title_ids}
+            _title_batches = False
+
+    titles, problems = {}, {}
+    for title_id in title_ids:
+        try:
+            titles[title_id] = fetch_title(title_id)
+        except typer.Exit as e:
+            problems[title_id] = str(e.exit_code)
+    return titles, problems
+
+
+def fetch_titles(title_ids: list[str], jobs: int = 1) -> tuple[dict[str, Title], dict[str, str]]:
+    """
+    Fetch metadata for many titles, TITLE_BATCH_SIZE per request with up to `jobs`
+    requests in flight, without touching the database. Returns (titles, problems).
+    """
+    chunks = [title_ids[i:i + TITLE_BATCH_SIZE] for i in range(0, len(title_ids), TITLE_BATCH_SIZE)]
+    titles, problems = {}, {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for found, failed in pool.map(fetch_title_chunk, chunks):
+            titles.update(found)
+            problems.update(failed)
+
+    for title_id in title_ids:
+        if title_id not in titles and title_id not in problems:
+            problems[title_id] = "not found on IMDb"
+    return titles, problems
+
+
+def lookup_titles(title_ids: Iterable[str], jobs: int = 1) -> tuple[dict[str, Title], dict[str, str]]:
+    """
+    Title metadata from the local store, fetching and storing the missing titles in
+    batches. Returns (titles, why each title that's left out couldn't be fetched).
+    """
+    title_ids = list(dict.fromkeys(title_ids))
+    titles = local_titles(title_ids)
+
+    fetched, problems = fetch_titles([title_id for title_id in title_ids if title_id not in titles], jobs)
+    store_titles(fetched.values())
+    titles.update(fetched)
+    return titles, problems
+
+
+def get_title(title_id: str) -> Title:
+    """Title metadata from the local store, fetching and storing it the first time."""
+    titles, problems = lookup_titles([title_id])
+    if title_id not in titles:
+        raise typer.Exit(problems[title_id])
+    return titles[title_id]
+
+
+def is_show(title_id: str) -> bool:
+    return get_title(title_id).type in SHOW_TYPES
+
+
+def call_with_retries(url: str, call: Callable[[], Any]) -> Any:
+    """Run call through the limiter of url's host, retrying transient failures with backoff."""
+    for attempt in range(API_RETRIES + 1):
+        try:
+            with host_slot(url):
+                return call()
+        except Exception as e:
+            if attempt == API_RETRIES or not is_transient(e):
+                raise
+            metrics.count("http.retries")
+            time.sleep(backoff_delay(attempt, e))
+
+
+def get_with_retries(url: str, headers: dict) -> tuple[int, http.client.HTTPMessage, bytes]:
+    return call_with_retries(url, lambda: imdb_client.get(url, headers=headers, timeout=HTTP_TIMEOUT))
+
+
+@metrics.timed("imdb.fetch_page")
 def fetch_page(url: str) -> dict:
-    req = Request(
-        url,
-        headers={
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:145.0) Gecko/20100101 Firefox/145.0"
-        },
-        method="GET",
-    )
+    cached = response_cache.load(url)
+    if cached and response_cache.is_fresh(url, cached[0]):
+        response_cache.hits += 1
+        return json.loads(cached[1])
+
+    headers = response_cache.validators(cached[0]) if cached else {}
 
     try:
-        with urlopen(req) as response:
-            return json.load(response)
+        status, response_headers, body = get_with_retries(url, headers)
+
+        if status == 304 and cached:
+            response_cache.revalidated += 1
+            meta, body = cached
+            response_cache.store(url, body, meta.get("etag"), meta.get("last_modified"))
+            return json.loads(body)
+
+        response_cache.misses += 1
+        data = json.loads(body)
+        response_cache.store(url, body, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+        return data
     except HTTPError as e:
-        raise typer.Exit(f"API Error ({e.code}): {e.reason}")
+        raise typer.Exit(f"API Error ({e.code}): {e.reason}") from e
     except URLError as e:
         raise typer.Exit(f"Network Connection Error: {e.reason}")
     except json.JSONDecodeError:
         raise typer.Exit("Error: Invalid response from API.")
 
 
-def get_episodes(title_id: str) -> list[dict]:
-    url_base = f"https://api.imdbapi.dev/titles/{title_id}/episodes?pageSize=50"
-
-    with db_transaction():
-        cursor.execute("SELECT last_page_token, latest_episode FROM shows WHERE title_id = ?", (title_id,))
-
-    last_page_token, latest_episode = cursor.fetchone()
+def iter_episode_pages(url_base: str, page_token: Optional[str]):
+    """Yield (page_token, episodes) one page at a time, following nextPageToken lazily."""
+    while True:
+        url = f"{url_base}&pageToken={page_token}" if page_token else url_base
+        data = fetch_page(url)
+        yield page_token, data.get("episodes", [])
 
-    if last_page_token:
-        url = f"{url_base}&pageToken={last_page_token}"
-        episode_number = latest_episode
-    else:
-        episode_number = 0
-        url = url_base
+        page_token = data.get("nextPageToken", "")
+        if not page_token:
+            return
 
-    data = fetch_page(url)
-    episodes = list(data.get("episodes", []))
 
-    page_token = last_page_token if last_page_token else data.get("nextPageToken", "")
+class Episode(NamedTuple):
+    """One parsed episode, in the column order of the episodes table after title_id."""
+    episode_id: str
+    season: Optional[str]
+    episode_number: int
+    title: str
+    plot: str
+    rating: float
+    release_date: Optional[str]
 
-    while page_token:
-        next_url = f"{url_base}&pageToken={page_token}"
-        data = fetch_page(next_url)
-        episodes.extend(data.get("episodes", []))
-        last_page_token = page_token
-        page_token = data.get("nextPageToken", "")
 
-    with db_transaction():
-        cursor.execute("UPDATE shows SET last_page_token = ? WHERE title_id = ?", (last_page_token, title_id))
+class EpisodePage(NamedTuple):
+    page_token: Optional[str]
+    episodes: list[Episode]
+    # Set on the last page when it reached an unreleased episode.
+    next_release_date: Optional[str]
 
-    episode_list = []
 
-    for episode in episodes:
-        if "releaseDate" not in episode:
-            continue
+def parse_episode(episode: dict) -> Optional[Episode]:
+    if "id" not in episode or "episodeNumber" not in episode:
+        return None
 
+    release_date = None
+    if "releaseDate" in episode:
         aux = episode["releaseDate"]
         year = aux.get("year", 1)
         month = aux.get("month", 1)
         day = aux.get("day", 1)
-        release_date = date(year, month, day)
+        release_date = date(year, month, day).isoformat()
+
+    return Episode(
+        episode["id"],
+        episode.get("season"),
+        episode["episodeNumber"],
+        episode.get("title", f"Episode {episode['episodeNumber']}"),
+        episode.get("plot", ""),
+        episode.get("rating", {}).get("aggregateRating", 0),
+        release_date,
+    )
 
-        if release_date > date.today():
-            break
 
-        if "episodeNumber" not in episode:
-            continue
-        
-        episode_number += 1
-        title = episode.get("title", f"Episode {episode_number}")
-        plot = episode.get("plot", "")
-        rating = episode.get("rating", {}).get("aggregateRating", 0)
+def fetch_episode_pages(title_id: str, last_page_token: Optional[str]) -> Iterator[EpisodePage]:
+    """
+    Yield the parsed episodes starting at last_page_token one page at a time, without
+    touching the database, so only the page being written has to be held in memory.
+    Stops requesting pages at the first unreleased episode, which ends the last page.
+    """
+    url_base = f"{IMDB_API}/titles/{title_id}/episodes?pageSize=50"
+    today = date.today().isoformat()
+    metrics.count("imdb.episode_syncs")
+
+    for page_token, raw_episodes in iter_episode_pages(url_base, last_page_token):
+        metrics.count("imdb.episode_pages")
+
+        episodes = []
+        next_release_date = None
+        for episode in filter(None, map(parse_episode, raw_episodes)):
+            episodes.append(episode)
+            if episode.release_date and episode.release_date > today:
+                next_release_date = episode.release_date
+                break
 
-        episode_list.append({"nr": episode_number, "title": title, "plot": plot, "rating": rating})
+        yield EpisodePage(page_token, episodes, next_release_date)
 
-    return episode_list
+        if next_release_date:
+            return
 
 
-def set_new_episodes(episode_list: list, show_id: int):
-    command = "INSERT INTO new_episodes (show_id, number, title, plot, rating) VALUES (?,?,?,?,?)"
+def store_episodes(title_id: str, episodes: Iterable[Episode]):
+    """Upsert episode records into the catalog, leaving unchanged rows untouched."""
+    command = """INSERT INTO episodes (title_id, episode_id, season, episode_number, title, plot, rating, release_date)
+    VALUES (?,?,?,?,?,?,?,?)
+    ON CONFLICT (title_id, episode_id) DO UPDATE SET
+        season = excluded.season,
+        episode_number = excluded.episode_number,
+        title = excluded.title,
+        plot = excluded.plot,
+        rating = excluded.rating,
+        release_date = excluded.release_date
+    WHERE (season, episode_number, title, plot, rating, release_date)
+        IS NOT (excluded.season, excluded.episode_number, excluded.title, excluded.plot, excluded.rating, excluded.release_date)"""
 
     with db_transaction():
-        cursor.execute("SELECT name, last_watched, latest_episode FROM shows WHERE id = ?", (show_id,))
+        cursor.executemany(command, ((title_id, *episode) for episode in episodes))
+        metrics.count("db.episodes_written", max(cursor.rowcount, 0))
+
+
+def number_released_episodes(title_id: str) -> int:
+    """
+    Give released episodes that don't have one yet the next absolute episode number,
+    in the order the API listed them. Returns the latest released episode number.
+    """
+    with db_transaction():
+        cursor.execute("SELECT COALESCE(MAX(number), 0) FROM episodes WHERE title_id = ?", (title_id,))
+        latest_episode = cursor.fetchone()[0]
+
+        cursor.execute(
+            "SELECT id FROM episodes WHERE title_id = ? AND number IS NULL AND release_date <= ? ORDER BY id",
+            (title_id, date.today().isoformat())
+        )
+        numbered = [(latest_episode + i, episode_id) for i, (episode_id,) in enumerate(cursor.fetchall(), 1)]
+        cursor.executemany("UPDATE episodes SET number = ? WHERE id = ?", numbered)
+
+    return latest_episode + len(numbered)
+
+
+def set_new_episodes(show_id: int, latest_episode: int):
+    """Bring a notified show's pending episodes in line with the catalog."""
+    insert = """INSERT INTO new_episodes (show_id, number, title, plot, rating)
+    SELECT s.id, e.number, e.title, e.plot, e.rating
+    FROM shows s JOIN episodes e ON e.title_id = s.title_id
+    WHERE s.id = ? AND s.notify = 1 AND e.number > s.last_watched
+        AND NOT EXISTS (SELECT 1 FROM new_episodes n WHERE n.show_id = s.id AND n.number = e.number)"""
+
+    changed = """UPDATE new_episodes SET (title, plot, rating) = (
+        SELECT e.title, e.plot, e.rating FROM episodes e JOIN shows s ON e.title_id = s.title_id
+        WHERE s.id = new_episodes.show_id AND e.number = new_episodes.number
+    )
+    WHERE show_id = ? AND EXISTS (
+        SELECT 1 FROM episodes e JOIN shows s ON e.title_id = s.title_id
+        WHERE s.id = new_episodes.show_id AND e.number = new_episodes.number
+            AND (e.title, e.plot, e.rating) IS NOT (new_episodes.title, new_episodes.plot, new_episodes.rating)
+    )"""
+
+    with db_transaction():
+        cursor.execute("DELETE FROM new_episodes WHERE show_id = ? AND number > ?", (show_id, latest_episode))
+        cursor.execute(changed, (show_id,))
+        metrics.count("db.new_episodes_written", cursor.rowcount)
+        cursor.execute(insert, (show_id,))
+        metrics.count("db.new_episodes_written", cursor.rowcount)
+
+
+def finish_sync(show_id: int, title_id: str, last_page_token: Optional[str], next_release_date: Optional[str]) -> int:
+    """
+    Number and queue the episodes stored for a show once all of its pages are in, as a
+    single transaction (or as part of the caller's). Returns its latest released episode number.
+    """
+    with db_transaction():
+        latest_episode = number_released_episodes(title_id)
+        set_new_episodes(show_id, latest_episode)
+
+        # Nothing announced and nothing aired for a long time: most likely finished.
+        cursor.execute("SELECT MAX(release_date) FROM episodes WHERE title_id = ? AND number IS NOT NULL", (title_id,))
+        last_release = cursor.fetchone()[0]
+        finished_before = (datetime.now() - timedelta(seconds=FINISHED_AFTER)).date().isoformat()
+        ended = next_release_date is None and last_release is not None and last_release < finished_before
+
+        cursor.execute(
+            """UPDATE shows SET last_page_token = ?, next_release_date = ?, latest_episode = ?, ended = ?, last_refreshed = ?
+            WHERE id = ?""",
+            (last_page_token, next_release_date, latest_episode, int(ended), time.time(), show_id)
+        )
+        cursor.execute(
+            """INSERT INTO titles (title_id, last_page_token) VALUES (?, ?)
+            ON CONFLICT (title_id) DO UPDATE SET last_page_token = excluded.last_page_token""",
+            (title_id, last_page_token)
+        )
+
+    return latest_episode
+
+
+def title_resume_token(title_id: str) -> Optional[str]:
+    """
+    Page token a new show of title_id resumes from. Titles without a catalog yet start
+    from the first page so every episode gets its number.
+    """
+    with db_transaction():
+        cursor.execute(
+            """SELECT last_page_token FROM titles WHERE title_id = ?
+            AND EXISTS (SELECT 1 FROM episodes WHERE episodes.title_id = titles.title_id)""",
+            (title_id,)
+        )
+
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def check_last_watched(name: str, last_watched: int, latest_episode: int):
+    """Reject episode numbers past the latest released one. Shows never synced aren't checked."""
+    if latest_episode and last_watched > latest_episode:
+        raise typer.Exit(f"{name} only has {latest_episode} released episodes.")
 
-    name, last_watched, latest_episode = cursor.fetchone()
-    for episode in episode_list:
-        if episode["nr"] > last_watched and episode["nr"] > latest_episode:
-            with db_transaction():
-                cursor.execute(command, (show_id, episode["nr"], episode["title"], episode["plot"], episode["rating"]))
-    
-    if len(episode_list) >= latest_episode:
-        get_video_for_latest_episode(episode_list[len(episode_list)-1]["nr"], name)
-    
 
 def delete_old_episodes(last_watched: int, show_id: int):
     with db_transaction():
         cursor.execute("DELETE FROM new_episodes WHERE show_id = ? AND number <= ?", (show_id, last_watched))
 
 
-def print_episode(show_name, ep, latest_episode):
-    if latest_episode == ep["number"]:
-        video_related = ""
+def format_episode(ep) -> str:
+    """One row of LIST_QUERY as text."""
+    show_name, number, title, status, rating, latest_episode, has_trailer, has_related_video, video_link = ep[:9]
 
-        with db_transaction():
-            cursor.execute("SELECT has_trailer, has_related_video, video_link FROM shows WHERE name = ?", (show_name,))
-    
-        has_trailer, has_related_video, video_link = cursor.fetchone()
+    if latest_episode == number:
         if has_trailer:
             video_related = f"has trailer on YouTube at: {video_link}"
         elif has_related_video:
             video_related = f"has related YouTube video at: {video_link}"
         else:
             video_related = "has no trailers or related videos on YouTube"
-        print(
-            f"[{show_name}] Ep {ep['number']}: {ep['title']} "
-            f"(show status = {ep['status']}, rating = {ep['rating']}, "
+        return (
+            f"[{show_name}] Ep {number}: {title} "
+            f"(show status = {status}, rating = {rating}, "
             f"{video_related})"
         )
-        return 
 
-    print(
-        f"[{show_name}] Ep {ep['number']}: {ep['title']} "
-        f"(show status = {ep['status']}, rating = {ep['rating']})"
+    return (
+        f"[{show_name}] Ep {number}: {title} "
+        f"(show status = {status}, rating = {rating})"
     )
 
 
-def print_show(show):
-    print(
-        f"Series name: {show[2]}, status: {show[3]}, latest episode: {show[4]}, "
-        f"last episode watched: {show[5]}, your rating: {show[6]}, "
-        f"notifications: {'ON' if show[8] else 'OFF'}"
+def format_show(show) -> str:
+    """One row of CATALOG_QUERY as text."""
+    return (
+        f"Series name: {show[0]}, status: {show[1]}, latest episode: {show[2]}, "
+        f"last episode watched: {show[3]}, your rating: {show[4]}, "
+        f"notifications: {'ON' if show[5] else 'OFF'}"
     )
 
 
+class Renderer(ABC):
+    """
+    Streams query rows to standard output in one OutputFormat. Output is collected and
+    written OUTPUT_BATCH pieces at a time; use it as a context manager so the rest is
+    written at the end.
+    """
+
+    def __init__(self, fields: tuple[str, ...], format_row: Callable[[tuple], str]):
+        self.fields = fields
+        self.format_row = format_row
+        self.rows = 0
+        self._pending: list[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        self.flush()
+
+    def write(self, text: str):
+        self._pending.append(text)
+        if len(self._pending) >= OUTPUT_BATCH:
+            self.flush()
+
+    def flush(self):
+        sys.stdout.write("".join(self._pending))
+        self._pending.clear()
+
+    def text(self, line: str):
+        """Headers and spacing meant for people, left out of machine readable formats."""
+
+    def row(self, row: tuple):
+        self.rows += 1
+        self.render(row)
+
+    @abstractmethod
+    def render(self, row: tuple):
+        """Write one row in this renderer's format."""
+
+    def close(self):
+        pass
+
+
+class TableRenderer(Renderer):
+    def text(self, line: str):
+        self.write(line + "\n")
+
+    def render(self, row: tuple):
+        self.write(self.format_row(row) + "\n")
+
+
+class NdjsonRenderer(Renderer):
+    def render(self, row: tuple):
+        self.write(json.dumps(dict(zip(self.fields, row))) + "\n")
+
+
+class JsonRenderer(Renderer):
+    """A single JSON array, written element by element."""
+
+    def render(self, row: tuple):
+        self.write(("[\n" if self.rows == 1 else ",\n") + json.dumps(dict(zip(self.fields, row))))
+
+    def close(self):
+        self.write("\n]\n" if self.rows else "[]\n")
+
+
+RENDERERS: dict[OutputFormat, type[Renderer]] = {
+    OutputFormat.table: TableRenderer,
+    OutputFormat.json: JsonRenderer,
+    OutputFormat.ndjson: NdjsonRenderer,
+}
+
+
 def get_api_key() -> str:
     env_key = os.getenv("YOUTUBE_API_KEY")
     if env_key:
@@ -292,38 +1743,125 @@ def get_api_key() -> str:
     return ""
 
 
-def get_youtube_videos(query, nr_of_videos) -> list:
-    developer_key = get_api_key()
-    if not developer_key:
-        return []
-    
-    youtube = build(
-        "youtube",
-        "v3",
-        developer_key
-    )
+def get_youtube_client():
+    """
+    Build the YouTube service once per process from the discovery document bundled
+    with googleapiclient, so no discovery request is made.
+    """
+    global _youtube_client
+
+    with _youtube_lock:
+        if _youtube_client is None:
+            from googleapiclient.discovery import build
+
+            _youtube_client = build(
+                "youtube",
+                "v3",
+                developerKey=get_api_key(),
+                static_discovery=True,
+                cache_discovery=False,
+                client_options={"api_endpoint": YOUTUBE_API},
+            )
+
+    return _youtube_client
+
 
-    request = youtube.search().list(
+def youtube_search_request(youtube, query: str, nr_of_videos: int):
+    return youtube.search().list(
         part="snippet",
         maxResults=nr_of_videos,
         q=query,
         type="video",
         videoDuration="short"
     )
-    response = request.execute()
+
+
+@metrics.timed("youtube.search")
+def get_youtube_videos(query, nr_of_videos) -> list:
+    developer_key = get_api_key()
+    if not developer_key:
+        return []
+
+    youtube = get_youtube_client()
+    request = youtube_search_request(youtube, query, nr_of_videos)
+
+    def execute():
+        # The service shares one httplib2 connection, which isn't thread safe.
+        with _youtube_lock:
+            return request.execute()
+
+    response = call_with_retries(YOUTUBE_URL, execute)
+    metrics.count("youtube.requests")
+    metrics.count("youtube.searches")
 
     return response.get("items", [])
 
 
-def get_video_for_latest_episode(episode_nr, show_name: str):
-    
-    query = f"{show_name} Episode {episode_nr} Trailer"
-    results = get_youtube_videos(query, 5)
+def get_youtube_videos_batch(queries: list[str], nr_of_videos: int) -> list[Optional[list]]:
+    """
+    Run several searches as HTTP batch requests, returning the items for each query
+    in order, or None for searches that failed.
+    """
+    results: list[Optional[list]] = [None for _ in queries]
+    if not queries or not get_api_key():
+        return results
+
+    from googleapiclient.http import BatchHttpRequest
+
+    youtube = get_youtube_client()
+    errors = []
+
+    def collect(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+            return
+        results[int(request_id)] = response.get("items", [])
+
+    def execute(start: int):
+        # Built by hand because new_batch_http_request ignores a custom api_endpoint.
+        batch = BatchHttpRequest(callback=collect, batch_uri=f"{YOUTUBE_API}batch")
+        for i, query in enumerate(queries[start:start + YOUTUBE_BATCH_SIZE], start):
+            batch.add(youtube_search_request(youtube, query, nr_of_videos), request_id=str(i))
+
+        with _youtube_lock, metrics.timer("youtube.batch"):
+            batch.execute()
+
+    for start in range(0, len(queries), YOUTUBE_BATCH_SIZE):
+        # A failed batch leaves its results as None, so those shows are looked up another time.
+        try:
+            call_with_retries(YOUTUBE_URL, lambda: execute(start))
+        except CircuitOpenError as e:
+            typer.echo(f"Skipping YouTube lookups for this run: {e}")
+            break
+        except Exception as e:
+            typer.echo(f"YouTube search failed: {e}")
+            continue
+        metrics.count("youtube.requests")
+        metrics.count("youtube.searches", len(queries[start:start + YOUTUBE_BATCH_SIZE]))
 
-    if not results:
-        return
+    if errors:
+        typer.echo(f"YouTube search failed for {len(errors)} shows: {errors[0]}")
+
+    return results
+
+
+def search_youtube(queries: list[str], nr_of_videos: int) -> list[Optional[list]]:
+    if len(queries) != 1:
+        return get_youtube_videos_batch(queries, nr_of_videos)
+
+    try:
+        return [get_youtube_videos(queries[0], nr_of_videos)]
+    except Exception as e:
+        typer.echo(f"YouTube search failed: {e}")
+        return [None]
 
-    set_clause = ""
+
+def video_query(episode_nr, show_name: str) -> str:
+    return f"{show_name} Episode {episode_nr} Trailer"
+
+
+def match_video(results: list, episode_nr, show_name: str) -> Optional[tuple[str, str, str]]:
+    """Pick the search result for the episode, returning (flag column, link, title)."""
     for video in results:
         video_title: str = video["snippet"]["title"]
         title_words = video_title.lower().split()
@@ -332,37 +1870,335 @@ def get_video_for_latest_episode(episode_nr, show_name: str):
             video_id = video["id"]["videoId"]
             video_link = f"https://www.youtube.com/watch?v={video_id}"
             if "trailer" in title_words or "sneak" in title_words and "peek" in title_words:
-                set_clause = f"has_trailer = '1', video_link = '{video_link}', video_title = '{video_title}'"
-                break
-            else:
-                set_clause = f"has_related_video = '1', video_link = '{video_link}', video_title = '{video_title}'"
-                break
+                return "has_trailer", video_link, video_title
+            return "has_related_video", video_link, video_title
 
-    if set_clause:
-        command = f"UPDATE shows SET {set_clause} WHERE name = ?"
-        with db_transaction():
-            cursor.execute(command, (show_name,))
+    return None
 
 
-@app.command(help="Refresh shows for new episodes")
-def refresh():
-    command = "SELECT id, title_id FROM shows WHERE notify = 1"
-    
+def quota_day() -> str:
+    """YouTube quotas reset at midnight Pacific time."""
+    try:
+        tz = ZoneInfo("America/Los_Angeles")
+    except ZoneInfoNotFoundError:
+        tz = timezone(timedelta(hours=-8))
+    return datetime.now(tz).date().isoformat()
+
+
+def remaining_quota() -> int:
+    daily_quota = int(os.getenv("YOUTUBE_DAILY_QUOTA", YOUTUBE_DAILY_QUOTA))
+
     with db_transaction():
-        cursor.execute(command)
+        cursor.execute("SELECT units FROM youtube_quota WHERE day = ?", (quota_day(),))
+        row = cursor.fetchone()
 
-    rows = cursor.fetchall()
+    return daily_quota - (row[0] if row else 0)
 
-    api_check = get_api_key()
-    if not api_check:
-        typer.echo("YOUTUBE_API_KEY not set as an environment variable.\nWe can't check for youtube related media for show.")
 
-    for (show_id, title_id) in rows:
-        episode_list = get_episodes(title_id)
-        set_new_episodes(episode_list, show_id)
-    
+def spend_quota(units: int):
+    command = """INSERT INTO youtube_quota (day, units) VALUES (?, ?)
+    ON CONFLICT (day) DO UPDATE SET units = units + excluded.units"""
+
+    with db_transaction():
+        cursor.execute(command, (quota_day(), units))
+        cursor.execute("DELETE FROM youtube_quota WHERE day < ?", (quota_day(),))
+
+
+def plan_video_searches(show_ids: set[int]) -> list[tuple[int, str, int]]:
+    """
+    Return (show_id, name, latest_episode) for the shows that still need a search,
+    most important first: watching before everything else, then by rating. Shows whose
+    latest episode already has a video, or was searched recently, are left out.
+    """
+    command = """SELECT s.id, s.name, s.latest_episode
+    FROM shows s
+    LEFT JOIN video_lookups v ON v.show_id = s.id AND v.number = s.latest_episode
+    WHERE s.notify = 1 AND s.latest_episode > 0
+        AND s.video_episode IS NOT s.latest_episode
+        AND (v.checked_at IS NULL OR v.checked_at < CASE WHEN v.video_link IS NULL THEN ? ELSE ? END)
+    ORDER BY s.status = 'watching' DESC, s.rating DESC, s.id"""
+
+    now = time.time()
+    with db_transaction():
+        cursor.execute(command, (now - VIDEO_MISSING_TTL, now - VIDEO_FOUND_TTL))
+
+    return [row for row in cursor.fetchall() if row[0] in show_ids]
+
+
+def save_video_lookup(show_id: int, episode_nr: int, video: Optional[tuple[str, str, str]]):
+    command = """INSERT OR REPLACE INTO video_lookups (show_id, number, video_flag, video_link, video_title, checked_at)
+    VALUES (?,?,?,?,?,?)"""
+    flag, video_link, video_title = video or (None, None, None)
+
+    with db_transaction():
+        cursor.execute(command, (show_id, episode_nr, flag, video_link, video_title, time.time()))
+        cursor.execute("DELETE FROM video_lookups WHERE show_id = ? AND number < ?", (show_id, episode_nr))
+
+
+def save_video(show_id: int, episode_nr: int, video: tuple[str, str, str]):
+    flag, video_link, video_title = video
+    command = """UPDATE shows SET has_trailer = ?, has_related_video = ?, video_link = ?, video_title = ?, video_episode = ?
+    WHERE id = ?"""
+
+    with db_transaction():
+        cursor.execute(command, (
+            int(flag == "has_trailer"), int(flag == "has_related_video"),
+            video_link, video_title, episode_nr, show_id
+        ))
+
+
+def lookup_videos(show_ids: set[int]):
+    """Search YouTube for the latest episode of the given shows without going over today's quota."""
+    planned = plan_video_searches(show_ids)
+    if not planned:
+        return
+
+    budget = max(remaining_quota() // YOUTUBE_SEARCH_COST, 0)
+    if len(planned) > budget:
+        typer.echo(f"YouTube daily quota reached, skipped searching for {len(planned) - budget} shows.")
+        planned = planned[:budget]
+        if not planned:
+            return
+
+    queries = [video_query(latest_episode, name) for (_, name, latest_episode) in planned]
+    search_results = search_youtube(queries, 5)
+
+    with db_transaction():
+        spend_quota(len(planned) * YOUTUBE_SEARCH_COST)
+
+        for (show_id, name, latest_episode), results in zip(planned, search_results):
+            if results is None:
+                continue
+
+            video = match_video(results, latest_episode, name)
+            save_video_lookup(show_id, latest_episode, video)
+            if video:
+                save_video(show_id, latest_episode, video)
+
+
+def refresh_shows(rows: list[tuple], jobs: int, progress: Optional[Callable[[int], None]] = None) -> set[int]:
+    """
+    Sync (show_id, title_id, name, resume token) rows and look up videos for them.
+    Workers only talk to the network; this thread is the single writer for the shared cursor.
+    progress, if given, is called with 1 after each show is written. A show whose fetch
+    fails is reported and left out of the returned ids instead of stopping the others.
+    """
+    # Each show hands its pages to this thread through a small queue of its own. Shows are
+    # written in order, each as one transaction, while workers fetch ahead; a worker blocks
+    # once its show's queue is full, so memory stays at a few pages per worker.
+    # The pool starts shows in order too, so the show being written always has a worker.
+    # A show that fails to be written is cancelled, so its worker stops instead of waiting
+    # on a queue nobody reads and the next show still gets a worker.
+    queues = {show_id: queue.Queue(maxsize=2) for (show_id, _, _, _) in rows}
+    cancelled = {show_id: threading.Event() for (show_id, _, _, _) in rows}
+    stop = threading.Event()
+
+    def stopped(show_id: int) -> bool:
+        return stop.is_set() or cancelled[show_id].is_set()
+
+    def put(show_id: int, item):
+        while not stopped(show_id):
+            try:
+                queues[show_id].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce(show_id: int, title_id: str, last_page_token: Optional[str]):
+        try:
+            for page in fetch_episode_pages(title_id, last_page_token):
+                put(show_id, page)
+                if stopped(show_id):
+                    return
+            put(show_id, None)
+        except Exception as e:
+            put(show_id, e)
+
+    def fetched_pages(show_id: int) -> Iterator[EpisodePage]:
+        while True:
+            item = queues[show_id].get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    refreshed = set()
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        for (show_id, title_id, _, last_page_token) in rows:
+            pool.submit(produce, show_id, title_id, last_page_token)
+
+        with metrics.timer("refresh.episodes"):
+            for (show_id, title_id, name, last_page_token) in rows:
+                next_release_date = None
+                try:
+                    # A show's pages, page token and latest episode are committed together.
+                    with db_transaction():
+                        for page in fetched_pages(show_id):
+                            with metrics.timer("refresh.store"):
+                                store_episodes(title_id, page.episodes)
+                            last_page_token = page.page_token or last_page_token
+                            next_release_date = page.next_release_date
+
+                        with metrics.timer("refresh.apply"):
+                            finish_sync(show_id, title_id, last_page_token, next_release_date)
+                except typer.Exit as e:
+                    cancelled[show_id].set()
+                    metrics.count("refresh.failed")
+                    typer.echo(f"Could not refresh {name}: {e.exit_code}")
+                    continue
+
+                refreshed.add(show_id)
+                if progress:
+                    progress(1)
+    finally:
+        stop.set()
+        pool.shutdown(cancel_futures=True)
+
+    if get_api_key():
+        with metrics.timer("refresh.videos"):
+            lookup_videos(refreshed)
+
+    return refreshed
+
+
+@app.command(help="Refresh shows for new episodes")
+def refresh(
+        jobs: Annotated[int, Option("--jobs", "-j", min=1, help="Number of shows to fetch in parallel.")] = 1,
+        commit: Annotated[CommitMode, Option("--commit", "-c", help="Commit after every show or once for the whole refresh.")] = "show",
+        force: Annotated[bool, Option("--force", "-f", help="Refresh every notified show, even ones with nothing due.")] = False):
+    with refresh_lock(wait=False):
+        command = f"SELECT id, title_id, name, {RESUME_TOKEN} FROM shows WHERE notify = 1"
+        params = []
+        if not force:
+            command += f" AND {DUE_SQL}"
+            now = time.time()
+            params = [date.today().isoformat(), now - REFRESH_MAX_AGE, now - REFRESH_ENDED_AGE]
+
         with db_transaction():
-            cursor.execute(f"UPDATE shows SET latest_episode = ? WHERE id = ?", (len(episode_list), show_id))
+            cursor.execute(command, params)
+            rows = cursor.fetchall()
+
+            cursor.execute("SELECT COUNT(*) FROM shows WHERE notify = 1")
+            skipped = cursor.fetchone()[0] - len(rows)
+
+        api_check = get_api_key()
+        if not api_check:
+            typer.echo("YOUTUBE_API_KEY not set as an environment variable.\nWe can't check for youtube related media for show.")
+
+        with ExitStack() as stack:
+            if commit == CommitMode.refresh:
+                stack.enter_context(db_transaction())
+            refreshed = refresh_shows(rows, jobs)
+
+    stats = imdb_client.stats()
+    typer.echo(
+        f"Refreshed {len(refreshed)} shows: {stats['requests']} IMDb requests over "
+        f"{stats['opened']} connections ({stats['reused']} requests reused a connection), "
+        f"{response_cache.hits} served from cache."
+    )
+    if skipped:
+        typer.echo(f"Skipped {skipped} shows with nothing due, use --force to refresh them too.")
+    if len(refreshed) < len(rows):
+        raise typer.Exit(f"Failed to refresh {len(rows) - len(refreshed)} shows, they stay due for the next refresh.")
+
+
+def poll_interval(show_id: int, min_interval: float, max_interval: float) -> float:
+    """
+    Seconds until a show should be checked again, from its next known release date or,
+    failing that, the gaps between its recent episodes. Shows on hold, or that look
+    finished, are checked as rarely as max_interval allows.
+    """
+    with db_transaction():
+        cursor.execute("SELECT title_id, status, next_release_date FROM shows WHERE id = ?", (show_id,))
+        title_id, status, next_release_date = cursor.fetchone()
+
+        cursor.execute(
+            "SELECT release_date FROM episodes WHERE title_id = ? AND number IS NOT NULL ORDER BY number DESC LIMIT ?",
+            (title_id, CADENCE_EPISODES)
+        )
+        releases = [date.fromisoformat(row[0]) for row in cursor.fetchall()]
+
+    today = date.today()
+    day = 24 * 60 * 60
+
+    if next_release_date:
+        days_until = (date.fromisoformat(next_release_date) - today).days
+        if days_until > 0:
+            interval = days_until * day
+        else:
+            # Due or overdue: poll often on the air date and back off while the API lags behind.
+            interval = min_interval * 2 ** -days_until
+    elif len(releases) >= 2:
+        gaps = sorted((newer - older).days for newer, older in zip(releases, releases[1:]))
+        cadence = max(gaps[len(gaps) // 2], 1) * day
+        since_last = (today - releases[0]).days * day
+        if since_last > max(3 * cadence, FINISHED_AFTER):
+            interval = max_interval
+        else:
+            interval = cadence / 4
+    else:
+        interval = WATCH_DEFAULT_INTERVAL
+
+    if status == Status.on_hold:
+        interval = max_interval
+
+    return min(max(interval, min_interval), max_interval)
+
+
+@app.command(help="Keep running and refresh each show when it is due")
+def watch(
+        jobs: Annotated[int, Option("--jobs", "-j", min=1, help="Number of shows to fetch in parallel.")] = 1,
+        min_interval: Annotated[int, Option("--min-interval", help="Minimum minutes between checks of a show.")] = WATCH_MIN_INTERVAL // 60,
+        max_interval: Annotated[int, Option("--max-interval", help="Maximum minutes between checks of a show.")] = WATCH_MAX_INTERVAL // 60):
+
+    if min_interval < 1 or max_interval < min_interval:
+        raise typer.Exit("Intervals must be positive and --max-interval at least --min-interval.")
+
+    # (next check time, show id); shows missing from it are picked up as due right away.
+    schedule: list[tuple[float, int]] = []
+    scheduled: set[int] = set()
+
+    typer.echo("Watching for new episodes, press Ctrl+C to stop.")
+    try:
+        while True:
+            now = time.time()
+
+            with db_transaction():
+                cursor.execute("SELECT id FROM shows WHERE notify = 1")
+            for (show_id,) in cursor.fetchall():
+                if show_id not in scheduled:
+                    heapq.heappush(schedule, (now, show_id))
+                    scheduled.add(show_id)
+
+            due = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heapq.heappop(schedule)[1])
+
+            if due:
+                placeholders = ", ".join("?" for _ in due)
+                with db_transaction():
+                    cursor.execute(
+                        f"SELECT id, title_id, name, {RESUME_TOKEN} FROM shows WHERE notify = 1 AND id IN ({placeholders})",
+                        due
+                    )
+                rows = cursor.fetchall()
+
+                with refresh_lock(wait=True):
+                    refreshed = refresh_shows(rows, jobs)
+                scheduled.difference_update(set(due) - refreshed)
+
+                for show_id in refreshed:
+                    heapq.heappush(schedule, (now + poll_interval(show_id, min_interval * 60, max_interval * 60), show_id))
+
+                typer.echo(f"[{datetime.now():%Y-%m-%d %H:%M}] Checked {len(refreshed)} shows.")
+
+            next_check = schedule[0][0] if schedule else now + WATCH_RESCAN_INTERVAL
+            time.sleep(max(0, min(next_check, now + WATCH_RESCAN_INTERVAL) - time.time()))
+    except KeyboardInterrupt:
+        typer.echo("Stopped watching.")
 
 
 @app.command(help="Add tv shows into your local storage")
@@ -370,11 +2206,12 @@ def add(
         name: Annotated[str, Argument(help="Name of the show.")], 
         imdb_link: Annotated[str, Argument(help="Link to the IMDb page for the show.")], 
         status: Annotated[Status, Option("--status", "-s", help="Watching status of the show.")] = "watching", 
-        last_watched: Annotated[int, Option("--last-watched", "-l", help="Number of the last watched episode.")] = None,
+        last_watched: Annotated[int, Option("--last-watched", "-l", min=0, help="Number of the last watched episode.")] = None,
         rating: Annotated[float, Option("--rating", "-r", help="Rating for the show between 1 and 10.")] = 0, 
         notify: Annotated[bool, Option(" /--notify", " /-n", help="Flag for if you DON'T want to be notified of new content.")] = True):
     
-    command = "INSERT INTO shows (title_id, name, imdb_link, status, latest_episode, last_watched, rating, notify) VALUES (?,?,?,?,?,?,?,?)"
+    command = """INSERT INTO shows (title_id, name, imdb_link, status, latest_episode, last_watched, rating, notify, added_at)
+    VALUES (?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP)"""
     
     title_id = get_title_id(imdb_link) 
 
@@ -383,37 +2220,45 @@ def add(
 
     if not is_show(title_id):
         raise typer.Exit("Not a show.")
-    
-    if last_watched is None:
-        if status == "watched":
-            last_watched = len(episode_list)
-        else:
-            last_watched = 0
-
-    with db_transaction():
-        cursor.execute(command, (title_id, name, imdb_link, status, 0, last_watched, rating, notify))
-        cursor.execute("SELECT id FROM shows WHERE name = ?", (name,))
 
-    show_id = cursor.fetchone()[0]
+    # Pages go into the catalog one short transaction at a time as they arrive, so only one
+    # page is held in memory and other writers never wait on the API. Catalog upserts can be
+    # repeated and numbering waits for finish_sync, so a failed fetch leaves no show behind.
+    last_page_token = title_resume_token(title_id)
+    next_release_date = None
+    for page in fetch_episode_pages(title_id, last_page_token):
+        store_episodes(title_id, page.episodes)
+        last_page_token = page.page_token or last_page_token
+        next_release_date = page.next_release_date
 
-    episode_list = get_episodes(title_id)
+    with db_transaction():
+        cursor.execute(command, (title_id, name, imdb_link, status, 0, last_watched or 0, rating, notify))
+        show_id = cursor.lastrowid
+        latest_episode = finish_sync(show_id, title_id, last_page_token, next_release_date)
+
+        # Watched shows without an explicit position are caught up to their latest episode.
+        if last_watched is None and status == "watched":
+            last_watched = latest_episode
+            cursor.execute("UPDATE shows SET last_watched = ? WHERE id = ?", (last_watched, show_id))
+            delete_old_episodes(last_watched, show_id)
+        elif last_watched is None:
+            last_watched = 0
+        check_last_watched(name, last_watched, latest_episode)
 
-    if notify and len(episode_list) != last_watched:
+    if notify and latest_episode and latest_episode != last_watched:
         api_check = get_api_key()
         if not api_check:
             typer.echo("YOUTUBE_API_KEY not set as an environment variable.")
             typer.echo("We can't check for youtube related media for show.")
-        set_new_episodes(episode_list, show_id)
-
-    with db_transaction():
-        cursor.execute(f"UPDATE shows SET latest_episode = ? WHERE name = ?", (len(episode_list), name))
+        else:
+            lookup_videos({show_id})
 
 
 @app.command(help="Update information about shows")
 def update(
         name: Annotated[str, Argument(help="Name of show you want to update.")],
         new_name: Annotated[str, Option("--new-name", "-n", help="Update name of show to new_name.")] = None,
-        last_watched: Annotated[int, Option("--last-watched", "-l", help="Update number of the last watched episode.")] = None,
+        last_watched: Annotated[int, Option("--last-watched", "-l", min=0, help="Update number of the last watched episode.")] = None,
         rating: Annotated[float, Option("--rating", "-r", help="Update the rating of show.")] = None,
         notify: Annotated[int, Option("--notify", "-t", help="Update notification status for show.")] = None,
         status: Annotated[Status, Option("--status", "-s", help="Update watching status for show.")] = None):
@@ -421,7 +2266,7 @@ def update(
     updates = {}
     if new_name:
         updates["name"] = new_name
-    if last_watched:
+    if last_watched is not None:
         updates["last_watched"] = str(last_watched)
     if rating:
         updates["rating"] = str(rating)
@@ -439,17 +2284,28 @@ def update(
         return
 
     with db_transaction():
-        cursor.execute("SELECT id, latest_episode FROM shows WHERE name = ?", (name,))
+        cursor.execute(
+            """SELECT id, latest_episode, (SELECT MAX(number) FROM episodes e WHERE e.title_id = shows.title_id)
+            FROM shows WHERE name = ?""",
+            (name,)
+        )
     
     aux = cursor.fetchone()
     if aux is None:
         raise typer.Exit(f"No show found with name '{name}'.")
     
     show_id = aux[0]
-    latest_episode = aux[1]
+    # Shows whose catalog isn't fetched yet (databases from before it, failed backfills)
+    # fall back to the stored latest episode and keep their pending episodes as they are.
+    has_catalog = aux[2] is not None
+    latest_episode = aux[2] if has_catalog else aux[1]
     
     if last_watched is None and status == "watched":
-            updates["last_watched"] = latest_episode 
+        last_watched = latest_episode
+        updates["last_watched"] = str(last_watched)
+
+    if last_watched is not None:
+        check_last_watched(name, last_watched, latest_episode)
 
     set_clause = ", ".join(f"{col} = ?" for col in updates.keys())
     command = f"UPDATE shows SET {set_clause} WHERE name = ?"
@@ -459,8 +2315,11 @@ def update(
     with db_transaction():
         cursor.execute(command, params)
 
-    if last_watched:
-        delete_old_episodes(last_watched, show_id)
+        if last_watched is not None:
+            delete_old_episodes(last_watched, show_id)
+        # Going back to an earlier episode or turning notifications on queues episodes from the catalog again.
+        if has_catalog and (last_watched is not None or "notify" in updates):
+            set_new_episodes(show_id, latest_episode)
 
 
 @app.command(help="Delete one show from storage")
@@ -482,51 +2341,51 @@ def catalog(
         sort_by_rating: Annotated[bool, Option("--rating", "-r", help="Sort shows by rating")] = False,
         sort_by_name: Annotated[bool, Option("--name", "-n", help="Sort shows by name")] = False,
         group_by_status: Annotated[bool, Option("--group-watch", "-w", help="Group by watching status")] = False,
-        filter_by_status: Annotated[Optional[list[Status]], Option("--filter", "-f", help="Filter by status")] = None):
-    
-    where_clause = ""
-    if filter_by_status:
-        statuses = [s.value for s in filter_by_status]
-        placeholders = ", ".join("?" for _ in statuses)
-        where_clause = f" WHERE status IN ({placeholders})"
-
-    command = f"SELECT * FROM shows{where_clause}"
-    with db_transaction():
-        cursor.execute(command)
-    
-    shows = cursor.fetchall()
+        filter_by_status: Annotated[Optional[list[Status]], Option("--filter", "-f", help="Filter by status")] = None,
+        limit: Annotated[Optional[int], Option("--limit", "-l", min=1, help="Show at most this many shows")] = None,
+        offset: Annotated[int, Option("--offset", "-o", min=0, help="Skip this many shows first")] = 0,
+        fmt: Annotated[OutputFormat, Option("--format", "-F", help="Output format.")] = OutputFormat.table):
     
     sort_key = sum(bool(key) for key in [sort_by_date, sort_by_name, sort_by_rating])
 
     if sort_key > 1:
         raise typer.Exit("Enter only one of the sorting flags --date, --rating or --name.")
 
+    where_clause = ""
+    params = []
+    if filter_by_status:
+        statuses = [s.value for s in filter_by_status]
+        placeholders = ", ".join("?" for _ in statuses)
+        where_clause = f" WHERE s.status IN ({placeholders})"
+        params.extend(statuses)
+
+    order_by = []
+    if group_by_status:
+        order_by.append(STATUS_ORDER_SQL)
     if sort_by_rating:
-        shows = sorted(shows, key = lambda x: x[6])
+        order_by.append("s.rating")
     elif sort_by_name:
-        shows = sorted(shows, key = lambda x: x[2])
-    else:
-        shows = sorted(shows, key = lambda x: x[0])
+        order_by.append("s.name")
+    elif sort_by_date:
+        order_by.append("s.added_at")
+    order_by.append("s.id")
 
-    if group_by_status:
-        statuses = ["watched", "dropped", "on_hold", "plan_to_watch", "watching"]
-        
-        shows_by_status = []
-        for show in shows:
-            shows_by_status[show[3]].append(show)
-        
-        for status in statuses:
-            if status not in shows_by_status:
-                continue
+    command = f"""{CATALOG_QUERY}{where_clause}
+    ORDER BY {", ".join(order_by)}
+    LIMIT ? OFFSET ?"""
+    params.extend([limit if limit is not None else -1, offset])
 
-            print(f"For {status}")
+    with db_transaction(read_only=True):
+        cursor.execute(command, params)
 
-            for show in shows_by_status:
-                print_show(show)
-        return
-    
-    for show in shows:
-        print_show(show)
+    status = None
+    with metrics.timer("output"), RENDERERS[fmt](CATALOG_FIELDS, format_show) as out:
+        for show in cursor:
+            if group_by_status and show[1] != status:
+                status = show[1]
+                out.text(f"For {status}")
+
+            out.row(show)
 
 
 @app.command(help="Flips the notify flag for a show.")
@@ -548,145 +2407,386 @@ def list_cmd(
         sort_by_date: Annotated[bool, Option("--date", "-d", help="(Not implemented) Sort by date")] = False,
         group_by_show: Annotated[bool, Option("--group-show", "-s", help="Group episodes by show")] = False,
         group_by_status: Annotated[bool, Option("--group-watch", "-w", help="Group by watching status")] = False,
-        filter_by_status: Annotated[Optional[list[Status]], Option("--filter", "-f", help="Filter by status")] = None):
+        filter_by_status: Annotated[Optional[list[Status]], Option("--filter", "-f", help="Filter by status")] = None,
+        fmt: Annotated[OutputFormat, Option("--format", "-F", help="Output format.")] = OutputFormat.table):
     
     sort_flags = [sort_by_rating, sort_by_title, sort_by_date]
     if sum(bool(f) for f in sort_flags) > 1:
         raise typer.Exit("Please use only one of the sorting flags: --rating, --title, or --date.")
 
     if sort_by_rating:
-        sort_key = "rating"
+        sort_key = "e.rating"
     elif sort_by_title:
-        sort_key = "title"
+        sort_key = "e.title"
     else:
-        sort_key = "number"
+        sort_key = "e.number"
 
-    where_clauses = ["notify = 1"]
+    where_clauses = ["s.notify = 1"]
     params = []
 
     if filter_by_status:
         statuses = [s.value for s in filter_by_status]
         placeholders = ", ".join("?" for _ in statuses)
-        where_clauses.append(f"status IN ({placeholders})")
+        where_clauses.append(f"s.status IN ({placeholders})")
         params.extend(statuses)
 
     where_sql = " AND ".join(where_clauses)
 
-    with db_transaction():
-        cursor.execute(f"SELECT * FROM shows WHERE {where_sql}", params)
-    shows = cursor.fetchall()
+    # Groups come out of SQL already ordered, so a header is printed whenever the group changes.
+    order_by = []
+    if group_by_status:
+        order_by.append(STATUS_ORDER_SQL)
+    if group_by_show:
+        order_by.append("s.id")
+    order_by.extend([sort_key, "e.id"])
 
-    if not shows:
-        raise typer.Exit("No shows match the given filters.")
+    command = f"""{LIST_QUERY}
+    WHERE {where_sql}
+    ORDER BY {", ".join(order_by)}"""
 
-    show_ids = [str(show[0]) for show in shows]
-    show_statuses = {show[0]: show[3] for show in shows}
-    latest_episodes = {show[2]: show[4] for show in shows}
-    placeholders = ", ".join("?" for _ in show_ids)
-    
-    with db_transaction():
-        cursor.execute(f"SELECT * FROM new_episodes WHERE show_id IN ({placeholders})", show_ids)
-    
-    new_episodes = cursor.fetchall()
+    with db_transaction(read_only=True):
+        cursor.execute(command, params)
 
-    if not new_episodes:
+    group = None
+    with metrics.timer("output"), RENDERERS[fmt](LIST_FIELDS, format_episode) as out:
+        for ep in cursor:
+            show_name, status, show_id = ep[0], ep[3], ep[9]
+
+            if group_by_show or group_by_status:
+                ep_group = (show_id if group_by_show else None, status if group_by_status else None)
+                if ep_group != group:
+                    if group is not None:
+                        out.text("")
+                    if group_by_show and group_by_status:
+                        out.text(f"For {show_name} (status = {status}):")
+                    elif group_by_show:
+                        out.text(f"For {show_name}:")
+                    else:
+                        out.text(f"Status: {status}")
+                    group = ep_group
+
+            out.row(ep)
+
+        if group is not None:
+            out.text("")
+
+    # Machine readable formats report an empty result as an empty one, like catalog does.
+    if not out.rows and fmt == OutputFormat.table:
+        with db_transaction():
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM shows s WHERE {where_sql})", params)
+        if not cursor.fetchone()[0]:
+            raise typer.Exit("No shows match the given filters.")
         raise typer.Exit("No new episodes found for the selected shows.")
 
-    def episode_dict(row):
-        return {
-            "id": row[0],
-            "show_id": row[1],
-            "number": row[2],
-            "title": row[3],
-            "plot": row[4],
-            "rating": row[5],
-            "status": show_statuses[row[1]],
-        }
 
-    episodes = [episode_dict(ep) for ep in new_episodes]
+def search_words(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
 
-    def sort_key_fn(ep):
-        if sort_key == "rating":
-            return ep["rating"]
-        elif sort_key == "title":
-            return ep["title"]
-        else:
-            return ep["number"]
-
-    if not group_by_show and not group_by_status:
-        episodes.sort(key=sort_key_fn)
-        for ep in episodes:
-            show_name = next(s[2] for s in shows if s[0] == ep["show_id"])
-            latest_ep = latest_episodes.get(show_name, "")
-            print_episode(show_name, ep, latest_ep)
-        return
 
-    if group_by_show and not group_by_status:
-        episodes_by_show: dict[int, list[dict]] = {}
-        for ep in episodes:
-            episodes_by_show.setdefault(ep["show_id"], []).append(ep)
-
-        for show_id, eps in episodes_by_show.items():
-            show_name = next(s[2] for s in shows if s[0] == show_id)
-            print(f"For {show_name}:")
-            eps.sort(key=sort_key_fn)
-            for ep in eps:
-                latest_ep = latest_episodes.get(show_name, "")
-                print_episode(show_name, ep, latest_ep)
-            print()
-        return
+def match_search_index(words: list[str], limit: int) -> list[int]:
+    """Rowids of search_index matching every word as a prefix, best bm25 rank first."""
+    query = " ".join(f'"{word}"*' for word in words)
+    cursor.execute("SELECT rowid FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT ?", (query, limit))
+    return [rowid for (rowid,) in cursor.fetchall()]
+
+
+def fuzzy_score(words: list[str], text: str) -> float:
+    """Average over the query words of how close the nearest word in text is."""
+    text_words = search_words(text)
+    if not text_words:
+        return 0.0
+    return sum(
+        max(difflib.SequenceMatcher(None, word, candidate).ratio() for candidate in text_words)
+        for word in words
+    ) / len(words)
+
+
+def match_search_trigrams(words: list[str], limit: int) -> list[int]:
+    """
+    Rowids of names and titles that look like the words, allowing for typos: candidates
+    share at least one trigram with them and are then ranked by fuzzy_score.
+    """
+    trigrams = sorted({word[i:i + 3] for word in words for i in range(len(word) - 2)})
+    if not trigrams:
+        return []
+
+    query = " OR ".join(f'"{trigram}"' for trigram in trigrams)
+    cursor.execute(
+        "SELECT rowid, name, title FROM search_trigrams WHERE search_trigrams MATCH ? ORDER BY rank LIMIT ?",
+        (query, limit * FUZZY_CANDIDATES)
+    )
+
+    scored = []
+    for rowid, name, title in cursor.fetchall():
+        score = max(fuzzy_score(words, name), fuzzy_score(words, title), fuzzy_score(words, f"{name} {title}"))
+        if score >= FUZZY_MIN_SCORE:
+            scored.append((-score, rowid))
+    return [rowid for _, rowid in sorted(scored)[:limit]]
+
+
+@app.command(help="Search show names and the titles and plots of new episodes")
+def search(
+        query: Annotated[str, Argument(help="Words to look for; the last letters of each can be left out.")],
+        fuzzy: Annotated[bool, Option("--fuzzy", "-z", help="Allow for typos instead of matching words exactly.")] = False,
+        limit: Annotated[int, Option("--limit", "-l", min=1, help="Show at most this many results")] = SEARCH_LIMIT):
+    words = search_words(query)
+    if not words:
+        raise typer.Exit("Enter at least one word to search for.")
+
+    with db_transaction(read_only=True):
+        cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('search_index', 'search_trigrams')")
+        tables = {name for (name,) in cursor.fetchall()}
+        if "search_index" not in tables:
+            raise typer.Exit("Search needs an SQLite build with FTS5.")
+
+        rowids = [] if fuzzy else match_search_index(words, limit)
+        similar = not rowids and not fuzzy
+        if not rowids and "search_trigrams" in tables:
+            rowids = match_search_trigrams(words, limit)
+
+        if not rowids:
+            raise typer.Exit("Nothing matches your search.")
+
+        # Even rowids are shows and odd ones pending episodes, see migrate_v7.
+        lines = []
+        for rowid in rowids:
+            if rowid % 2 == 0:
+                cursor.execute(f"{CATALOG_QUERY} WHERE s.id = ?", (rowid // 2,))
+                lines.append(format_show(cursor.fetchone()))
+            else:
+                cursor.execute(f"{LIST_QUERY} WHERE e.id = ?", (rowid // 2,))
+                lines.append(format_episode(cursor.fetchone()))
+
+    if similar:
+        typer.echo("No exact matches, showing similar ones.")
+    for line in lines:
+        print(line)
+
+
+def print_stats(row):
+    """Print one row of STATS_QUERY."""
+    name, status, pending, max_pending, rating_sum, last_refreshed = row
+    pending_info = f"{pending} (up to Ep {max_pending})" if pending else "0"
+    average = f"{rating_sum / pending:.1f}" if pending else "-"
+    refreshed = f"{datetime.fromtimestamp(last_refreshed):%Y-%m-%d %H:%M}" if last_refreshed else "never"
+    print(
+        f"Series name: {name}, status: {status}, new episodes: {pending_info}, "
+        f"average episode rating: {average}, last refreshed: {refreshed}"
+    )
+
+
+@app.command(help="Show new episode counts and ratings per show and status")
+def stats(totals_only: Annotated[bool, Option("--totals", "-t", help="Only print the totals per status")] = False):
+    with db_transaction(read_only=True):
+        cursor.execute(f"{STATS_QUERY} ORDER BY st.pending DESC, s.name")
+
+    # status -> [shows, pending episodes, rating sum]
+    totals: dict[str, list] = {}
+    for row in cursor:
+        if not totals_only:
+            print_stats(row)
+
+        total = totals.setdefault(row[1], [0, 0, 0.0])
+        total[0] += 1
+        total[1] += row[2]
+        total[2] += row[4]
+
+    if not totals:
+        raise typer.Exit("No shows in your list yet.")
+
+    if not totals_only:
+        print()
+    for status in reversed(STATUS_ORDER):
+        if status in totals:
+            shows, pending, rating_sum = totals[status]
+            average = f", average rating {rating_sum / pending:.1f}" if pending else ""
+            print(f"{status}: {shows} shows, {pending} new episodes{average}")
+
+
+def read_import_rows(path: str, fmt: ImportFormat) -> Iterator[dict]:
+    if fmt == ImportFormat.csv:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    elif fmt == ImportFormat.jsonl:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        yield from data if isinstance(data, list) else data.get("shows", [])
+
+
+def normalize_import_row(row: dict) -> dict:
+    """
+    Map a row from a BingeWatcher export, a hand written file or an IMDb list export
+    onto the shows columns. Raises ValueError when the row can't be imported.
+    """
+    title_type = row.get("Title Type", "")
+    if title_type and title_type not in ("TV Series", "TV Mini Series", "tvSeries", "tvMiniSeries"):
+        raise ValueError(f"{title_type} is not a show")
+
+    imdb_link = row.get("imdb_link") or row.get("URL") or ""
+    title_id = row.get("title_id") or row.get("Const") or get_title_id(imdb_link)
+    if not title_id:
+        raise ValueError("missing IMDb link or title id")
+    if not imdb_link:
+        imdb_link = f"https://www.imdb.com/title/{title_id}/"
+
+    name = row.get("name") or row.get("Title")
+    if not name:
+        raise ValueError("missing name")
+
+    status = Status(row.get("status") or "watching")
+    last_watched = row.get("last_watched")
+    rating = row.get("rating") or row.get("Your Rating") or 0
+
+    notify = row.get("notify")
+    if notify in (None, ""):
+        notify = status in (Status.watching, Status.plan_to_watch)
+    elif isinstance(notify, str):
+        notify = notify.strip().lower() in ("1", "true", "yes", "on")
+
+    return {
+        "title_id": title_id,
+        "name": name,
+        "imdb_link": imdb_link,
+        "status": status.value,
+        "last_watched": None if last_watched in (None, "") else int(last_watched),
+        "rating": float(rating),
+        "notify": int(bool(notify)),
+    }
+
+
+@app.command("import", help="Import shows from a CSV, JSON or JSONL file (including IMDb list exports)")
+def import_cmd(
+        path: Annotated[str, Argument(help="File to import.")],
+        fmt: Annotated[Optional[ImportFormat], Option("--format", "-F", help="File format, guessed from the extension by default.")] = None,
+        jobs: Annotated[int, Option("--jobs", "-j", min=1, help="Number of titles to check and fetch in parallel.")] = 4):
+
+    if fmt is None:
+        extension = os.path.splitext(path)[1].lower().lstrip(".")
+        fmt = ImportFormat.jsonl if extension == "ndjson" else ImportFormat(extension) if extension in ImportFormat.__members__ else None
+        if fmt is None:
+            raise typer.Exit("Can't tell the file format from its extension, use --format.")
 
-    if group_by_status and not group_by_show:
-        episodes_by_status: dict[str, list[dict]] = {}
-        for ep in episodes:
-            episodes_by_status.setdefault(ep["status"], [])
-            episodes_by_status[ep["status"]].append(ep)
+    with db_transaction():
+        cursor.execute("SELECT title_id, name FROM shows")
+        known = cursor.fetchall()
+    known_titles = {title_id for title_id, _ in known}
+    known_names = {name for _, name in known}
 
-        status_order = ["watched", "dropped", "on_hold", "plan_to_watch", "watching"]
+    shows = []
+    skipped = 0
+    try:
+        for line, row in enumerate(read_import_rows(path, fmt), 1):
+            # Exports also carry pending episodes, those come back with the backfill.
+            if row.get("type", "show") != "show":
+                continue
 
-        for status in status_order:
-            if status not in episodes_by_status:
+            try:
+                show = normalize_import_row(row)
+            except (ValueError, TypeError) as e:
+                typer.echo(f"Skipping row {line}: {e}.")
+                skipped += 1
                 continue
 
-            print(f"Status: {status}")
-            eps = episodes_by_status[status]
-            eps.sort(key=sort_key_fn)
-            show_name = next(s[2] for s in shows if s[0] == ep["show_id"])
-            for ep in eps:
-                latest_ep = latest_episodes.get(show_name, "")
-                print_episode(show_name, ep, latest_ep)
-            print()
+            if show["title_id"] in known_titles or show["name"] in known_names:
+                skipped += 1
+                continue
+            known_titles.add(show["title_id"])
+            known_names.add(show["name"])
+            shows.append(show)
+    except (OSError, ValueError, csv.Error) as e:
+        raise typer.Exit(f"Can't read {path}: {e}")
+
+    titles, problems = lookup_titles((show["title_id"] for show in shows), jobs)
+
+    valid = []
+    for show in shows:
+        title = titles.get(show["title_id"])
+        problem = problems.get(show["title_id"]) if title is None else None if title.type in SHOW_TYPES else "not a show"
+        if problem:
+            typer.echo(f"Skipping {show['name']} ({show['title_id']}): {problem}.")
+            skipped += 1
+        else:
+            valid.append(show)
+
+    command = """INSERT INTO shows (title_id, name, imdb_link, status, latest_episode, last_watched, rating, notify, added_at)
+    VALUES (?,?,?,?,0,?,?,?,CURRENT_TIMESTAMP)"""
+
+    with db_transaction():
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM shows")
+        last_id = cursor.fetchone()[0]
+
+        cursor.executemany(command, (
+            (show["title_id"], show["name"], show["imdb_link"], show["status"],
+             show["last_watched"] or 0, show["rating"], show["notify"])
+            for show in valid
+        ))
+
+        cursor.execute(f"SELECT id, title_id, name, {RESUME_TOKEN} FROM shows WHERE id > ?", (last_id,))
+        rows = cursor.fetchall()
+
+    typer.echo(f"Imported {len(valid)} shows, skipped {skipped}.")
+    if not rows:
         return
 
-    episodes_by_show_and_status: dict[tuple[int, str], list[dict]] = {}
-    for ep in episodes:
-        episodes_by_show_and_status.setdefault((ep["show_id"], ep["status"]), []).append(ep)
+    with refresh_lock(wait=True), typer.progressbar(length=len(rows), label="Fetching episodes") as bar:
+        refresh_shows(rows, jobs, progress=bar.update)
 
-    status_order = ["watched", "dropped", "on_hold", "plan_to_watch", "watching"]
+    # Watched shows without an explicit position are caught up to their latest episode.
+    watched = [show["title_id"] for show in valid if show["status"] == Status.watched and show["last_watched"] is None]
+    if watched:
+        with db_transaction():
+            cursor.executemany("UPDATE shows SET last_watched = latest_episode WHERE title_id = ?", ((t,) for t in watched))
+            cursor.executemany(
+                "DELETE FROM new_episodes WHERE show_id = (SELECT id FROM shows WHERE title_id = ?)",
+                ((t,) for t in watched)
+            )
+
+
+@app.command(help="Write shows and pending episodes as JSON lines")
+def export(output: Annotated[Optional[str], Argument(help="File to write, standard output by default.")] = None):
+    queries = (
+        ("show", "SELECT * FROM shows ORDER BY id"),
+        ("new_episode", """SELECT s.name AS show, e.number, e.title, e.plot, e.rating
+        FROM new_episodes e JOIN shows s ON s.id = e.show_id ORDER BY s.id, e.number"""),
+    )
 
-    for status in status_order:
-        for (show_id, status_key), eps in episodes_by_show_and_status.items():
-            if status_key != status:
-                continue
+    with ExitStack() as stack:
+        out = stack.enter_context(open(output, "w", encoding="utf-8")) if output else sys.stdout
 
-            show_name = next(s[2] for s in shows if s[0] == show_id)
-            print(f"For {show_name} (status = {status}):")
+        for kind, query in queries:
+            with db_transaction(read_only=True):
+                cursor.execute(query)
+            columns = ["type"] + [column[0] for column in cursor.description]
 
-            eps.sort(key=sort_key_fn)
-            for ep in eps:
-                latest_ep = latest_episodes.get(show_name, "")
-                print_episode(show_name, ep, latest_ep)
-            print()
-    return
+            for row in cursor:
+                out.write(json.dumps(dict(zip(columns, (kind, *row)))))
+                out.write("\n")
 
 
 @app.command(help="Seed the database with some shows")
 def seed():
-    add("Breakings Bad", "https://www.imdb.com/title/tt0903747/", "watching", 44, 8)
-    add("Invincible", "https://www.imdb.com/title/tt6741278/", "watching", 10)
-    add("Hunter x Hunter", "https://www.imdb.com/title/tt2098220/", "watching", 46, 10)
-    add("Cowboy Bebop", "https://www.imdb.com/title/tt0213338/", "plan_to_watch", 20, 0, 0)
-    add("Pluribus", "https://www.imdb.com/title/tt22202452", "plan_to_watch", 6, 0)
+    shows = [
+        ("Breakings Bad", "https://www.imdb.com/title/tt0903747/", "watching", 44, 8),
+        ("Invincible", "https://www.imdb.com/title/tt6741278/", "watching", 10),
+        ("Hunter x Hunter", "https://www.imdb.com/title/tt2098220/", "watching", 46, 10),
+        ("Cowboy Bebop", "https://www.imdb.com/title/tt0213338/", "plan_to_watch", 20, 0, 0),
+        ("Pluribus", "https://www.imdb.com/title/tt22202452", "plan_to_watch", 6, 0),
+    ]
+    # Look every title up in one batch, so each add finds its title locally.
+    lookup_titles(get_title_id(show[1]) for show in shows)
+    for show in shows:
+        add(*show)
+
+
+@app.command("clear_cache", help="Delete cached IMDb API responses.")
+def clear_cache():
+    response_cache.clear()
+    print("Cache cleared.")
 
 
 @app.command("delete_whole", help="Delete the whole database of shows.")
@@ -698,6 +2798,14 @@ def dele():
     with db_transaction():
         cursor.execute("DROP TABLE shows")
         cursor.execute("DROP TABLE new_episodes")
+        cursor.execute("DROP TABLE episodes")
+        cursor.execute("DROP TABLE IF EXISTS search_index")
+        cursor.execute("DROP TABLE IF EXISTS search_trigrams")
+        cursor.execute("DROP TABLE IF EXISTS show_stats")
+        cursor.execute("DROP TABLE IF EXISTS titles")
+        cursor.execute("PRAGMA user_version = 0")
+
+if __name__ == "__main__":
+    app()
 
-app()
 